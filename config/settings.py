@@ -1,103 +1,193 @@
 # ----------------------- config/settings.py -----------------------
 from __future__ import annotations
-import os, json
+import os, json, sys
+import functools
+from dataclasses import dataclass
 from dotenv import load_dotenv
 
-load_dotenv()
+# [ADD] orjson (nhanh hơn ~5x) nếu có; fallback stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
 
 # -------- helpers ----------
-def _env_bool(key: str, default: str = "false") -> bool:
-    return (os.getenv(key, default) or "").strip().lower() in ("1","true","yes","on","y")
+_TRUTHY = frozenset({"1","true","yes","on","y"})
 
-def _as_float(env_key: str, default: str) -> float:
-    try:
-        return float(os.getenv(env_key, default))
-    except Exception:
-        return float(default)
+def _bool(v: str) -> bool:
+    return v.strip().lower() in _TRUTHY
 
-def _as_int(env_key: str, default: str) -> int:
+def _int(v: str) -> int:
+    return int(float(v))  # chấp nhận "8.0"
+
+def _env(key: str, default, cast=str):
+    """Đọc 1 ENV + ép kiểu; thiếu key hoặc lỗi parse → default."""
+    v = os.environ.get(key)
+    if v is None:
+        return default
     try:
-        return int(float(os.getenv(env_key, default)))
+        return cast(v)
     except Exception:
-        return int(default)
-
-# ===== Telegram =====
-TELEGRAM_BOT_TOKEN            = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
-TELEGRAM_CHAT_ID              = os.getenv("TELEGRAM_CHAT_ID", "").strip()
-
-# Kênh phát kèo (EXECUTE-only)
-TELEGRAM_BROADCAST_BOT_TOKEN  = os.getenv("TELEGRAM_BROADCAST_BOT_TOKEN", "").strip()
-TELEGRAM_BROADCAST_CHAT_ID    = os.getenv("TELEGRAM_BROADCAST_CHAT_ID", "").strip()
-
-# ===== Modes / Defaults =====
-MODE           = os.getenv("MODE", "manual").strip().lower()   # manual | auto
-DEFAULT_MODE   = os.getenv("DEFAULT_MODE", MODE)
-PAIR           = os.getenv("PAIR", "BTC/USDT").strip().upper()
-PRESET_MODE    = os.getenv("PRESET_MODE", "auto")
-
-# ===== Exchange — Single-account (Binance fallback như bản cũ) =====
-EXCHANGE_ID    = os.getenv("EXCHANGE", "binanceusdm").strip().lower()
-API_KEY        = os.getenv("API_KEY", "").strip()
-API_SECRET     = os.getenv("API_SECRET", "").strip()
-TESTNET        = _env_bool("TESTNET", "false")
-
-# Cho phép /settings thay đổi risk/leverage chung
-RISK_PERCENT_DEFAULT = _as_float("RISK_PERCENT", "20")
-LEVERAGE_DEFAULT     = _as_int("LEVERAGE", "44")
-
-# ===== Weather / Tide (để tránh ImportError ở data/moon_tide.py) =====
-WEATHERAPI_KEY = os.getenv("WEATHERAPI_KEY", "").strip()
-WORLDTIDES_KEY = os.getenv("WORLDTIDES_KEY", "").strip()
-try:
-    LAT = float(os.getenv("LAT", "10.8231"))
-    LON = float(os.getenv("LON", "106.6297"))
-except Exception:
-    LAT, LON = 10.8231, 106.6297
-
-# ===== Scheduler / Runtime knobs =====
-TIDE_WINDOW_HOURS     = _as_float("TIDE_WINDOW_HOURS", "2.5")
-SCHEDULER_TICK_SEC    = _as_int("SCHEDULER_TICK_SEC", "2")
-MAX_ORDERS_PER_DAY    = _as_int("MAX_ORDERS_PER_DAY", "8")
-MAX_ORDERS_PER_TIDE_WINDOW = _as_int("MAX_ORDERS_PER_TIDE_WINDOW", "2")
-M5_MAX_DELAY_SEC      = _as_int("M5_MAX_DELAY_SEC", "60")
-# NEW: thời gian tối đa chờ duyệt pending (phút)
-MAX_PENDING_MINUTES   = _as_int("MAX_PENDING_MINUTES", "10")
-
-# ===== Debug flags =====
-AUTO_DEBUG                = _env_bool("AUTO_DEBUG", "true")
-AUTO_DEBUG_VERBOSE        = _env_bool("AUTO_DEBUG_VERBOSE", "false")
-AUTO_DEBUG_ONLY_WHEN_SKIP = _env_bool("AUTO_DEBUG_ONLY_WHEN_SKIP", "false")
-
-# ===== Multi-account (Phase2) =====
-# ACCOUNTS_JSON: 1 dòng JSON list các account bổ sung (BingX/OKX...)
-# Ví dụ 1 dòng cho BingX (đặt trong .env):
-# ACCOUNTS_JSON=[{"name":"bingx_test","exchange":"bingx","api_key":"<BINGX_KEY>","api_secret":"<BINGX_SECRET>","testnet":false,"pair":"BTC/USDT:USDT"}]
-ACCOUNTS_JSON = (os.getenv("ACCOUNTS_JSON", "") or "").strip()
-ACCOUNTS: list[dict] = []
-if ACCOUNTS_JSON:
+        return default
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    # ===== Telegram =====
+    TELEGRAM_BOT_TOKEN: str
+    TELEGRAM_CHAT_ID: str
+    # Kênh phát kèo (EXECUTE-only)
+    TELEGRAM_BROADCAST_BOT_TOKEN: str
+    TELEGRAM_BROADCAST_CHAT_ID: str
+
+    # ===== Modes / Defaults =====
+    MODE: str
+    DEFAULT_MODE: str
+    PAIR: str
+    PRESET_MODE: str
+
+    # ===== Exchange — Single-account =====
+    EXCHANGE_ID: str
+    API_KEY: str
+    API_SECRET: str
+    TESTNET: bool
+    RISK_PERCENT_DEFAULT: float
+    LEVERAGE_DEFAULT: int
+
+    # ===== Weather / Tide =====
+    WEATHERAPI_KEY: str
+    WORLDTIDES_KEY: str
+    LAT: float
+    LON: float
+
+    # ===== Scheduler / Runtime knobs =====
+    TIDE_WINDOW_HOURS: float
+    SCHEDULER_TICK_SEC: int
+    MAX_ORDERS_PER_DAY: int
+    MAX_ORDERS_PER_TIDE_WINDOW: int
+    M5_MAX_DELAY_SEC: int
+    MAX_PENDING_MINUTES: int
+
+    # ===== Debug flags =====
+    AUTO_DEBUG: bool
+    AUTO_DEBUG_VERBOSE: bool
+    AUTO_DEBUG_ONLY_WHEN_SKIP: bool
+
+    # ===== Multi-account (Phase2) =====
+    ACCOUNTS_JSON: str
+    SINGLE_ACCOUNT: dict
+
+
+@functools.lru_cache(maxsize=1)
+def settings() -> Settings:
+    """
+    Đọc .env + ENV đúng 1 lần cho cả process (kết quả được cache).
+    Các module khác vẫn import như cũ: `from config.settings import PAIR`
+    (được proxy qua __getattr__ bên dưới).
+    """
+    load_dotenv()
+
+    exchange_id = sys.intern(os.getenv("EXCHANGE", "binanceusdm").strip().lower())
+    api_key     = os.getenv("API_KEY", "").strip()
+    api_secret  = os.getenv("API_SECRET", "").strip()
+    testnet     = _env("TESTNET", False, _bool)
+    mode        = os.getenv("MODE", "manual").strip().lower()   # manual | auto
+    pair        = sys.intern(os.getenv("PAIR", "BTC/USDT").strip().upper())
+
+    # Cho phép /settings thay đổi risk/leverage chung
+    risk_default = _env("RISK_PERCENT", 20.0, float)
+    lev_default  = _env("LEVERAGE", 44, _int)
+
+    return Settings(
+        TELEGRAM_BOT_TOKEN           = os.getenv("TELEGRAM_BOT_TOKEN", "").strip(),
+        TELEGRAM_CHAT_ID             = os.getenv("TELEGRAM_CHAT_ID", "").strip(),
+        TELEGRAM_BROADCAST_BOT_TOKEN = os.getenv("TELEGRAM_BROADCAST_BOT_TOKEN", "").strip(),
+        TELEGRAM_BROADCAST_CHAT_ID   = os.getenv("TELEGRAM_BROADCAST_CHAT_ID", "").strip(),
+
+        MODE         = mode,
+        DEFAULT_MODE = os.getenv("DEFAULT_MODE", mode),
+        PAIR         = pair,
+        PRESET_MODE  = os.getenv("PRESET_MODE", "auto"),
+
+        EXCHANGE_ID          = exchange_id,
+        API_KEY              = api_key,
+        API_SECRET           = api_secret,
+        TESTNET              = testnet,
+        RISK_PERCENT_DEFAULT = risk_default,
+        LEVERAGE_DEFAULT     = lev_default,
+
+        WEATHERAPI_KEY = os.getenv("WEATHERAPI_KEY", "").strip(),
+        WORLDTIDES_KEY = os.getenv("WORLDTIDES_KEY", "").strip(),
+        # Weather / Tide (để tránh ImportError ở data/moon_tide.py)
+        LAT            = _env("LAT", 10.8231, float),
+        LON            = _env("LON", 106.6297, float),
+
+        TIDE_WINDOW_HOURS          = _env("TIDE_WINDOW_HOURS", 2.5, float),
+        SCHEDULER_TICK_SEC         = _env("SCHEDULER_TICK_SEC", 2, _int),
+        MAX_ORDERS_PER_DAY         = _env("MAX_ORDERS_PER_DAY", 8, _int),
+        MAX_ORDERS_PER_TIDE_WINDOW = _env("MAX_ORDERS_PER_TIDE_WINDOW", 2, _int),
+        M5_MAX_DELAY_SEC           = _env("M5_MAX_DELAY_SEC", 60, _int),
+        # NEW: thời gian tối đa chờ duyệt pending (phút)
+        MAX_PENDING_MINUTES        = _env("MAX_PENDING_MINUTES", 10, _int),
+
+        AUTO_DEBUG                = _env("AUTO_DEBUG", True, _bool),
+        AUTO_DEBUG_VERBOSE        = _env("AUTO_DEBUG_VERBOSE", False, _bool),
+        AUTO_DEBUG_ONLY_WHEN_SKIP = _env("AUTO_DEBUG_ONLY_WHEN_SKIP", False, _bool),
+
+        ACCOUNTS_JSON = (os.getenv("ACCOUNTS_JSON", "") or "").strip(),
+        # Fallback Single Binance account (y như bản cũ)
+        SINGLE_ACCOUNT = {
+            "name": "default",
+            "exchange": exchange_id,          # "binanceusdm"
+            "api_key": api_key,
+            "api_secret": api_secret,
+            "testnet": testnet,
+            "pair": pair,                     # giữ "BTC/USDT" cho Binance
+            # risk/leverage mặc định; runtime /settings sẽ ghi đè khi execute
+            "risk_percent": risk_default,
+            "leverage": lev_default,
+        },
+    )
+
+
+@functools.cache
+def get_accounts() -> list[dict]:
+    """
+    Parse ACCOUNTS_JSON lười (lần đầu cần multi-account), kết quả được cache.
+    Gọi get_accounts.cache_clear() sau khi đổi ENV để đọc lại.
+    """
+    # ACCOUNTS_JSON: 1 dòng JSON list các account bổ sung (BingX/OKX...)
+    # Ví dụ 1 dòng cho BingX (đặt trong .env):
+    # ACCOUNTS_JSON=[{"name":"bingx_test","exchange":"bingx","api_key":"<BINGX_KEY>","api_secret":"<BINGX_SECRET>","testnet":false,"pair":"BTC/USDT:USDT"}]
+    settings()  # [MOD] .env đã nạp 1 lần trong settings() (lru_cache) — không load_dotenv() lại
+    accounts_json = (os.getenv("ACCOUNTS_JSON", "") or "").strip() or "[]"
     try:
-        ACCOUNTS = json.loads(ACCOUNTS_JSON)
-        if not isinstance(ACCOUNTS, list):
-            ACCOUNTS = []
+        v = orjson.loads(accounts_json) if orjson else json.loads(accounts_json)
+        if not isinstance(v, list):
+            return []
+        # intern key + giá trị chuỗi ngắn (exchange/name/pair...) → lookup dict so sánh con trỏ
+        return [
+            {sys.intern(k): (sys.intern(x) if isinstance(x, str) else x) for k, x in a.items()}
+            if isinstance(a, dict) else a
+            for a in v
+        ]
     except Exception:
-        ACCOUNTS = []
-
-# Fallback Single Binance account (y như bản cũ)
-SINGLE_ACCOUNT = {
-    "name": "default",
-    "exchange": EXCHANGE_ID,          # "binanceusdm"
-    "api_key": API_KEY,
-    "api_secret": API_SECRET,
-    "testnet": TESTNET,
-    "pair": PAIR,                     # giữ "BTC/USDT" cho Binance
-    # risk/leverage mặc định; runtime /settings sẽ ghi đè khi execute
-    "risk_percent": RISK_PERCENT_DEFAULT,
-    "leverage": LEVERAGE_DEFAULT,
-}
+        return []
+
 
 # ===== Compatibility exports =====
-EXCHANGE = EXCHANGE_ID
-DEFAULT_PAIR = PAIR
-DEFAULT_PRESET_MODE = PRESET_MODE
-# ----------------------- /config/settings.py -----------------------
+_ALIASES = {
+    "EXCHANGE": "EXCHANGE_ID",
+    "DEFAULT_PAIR": "PAIR",
+    "DEFAULT_PRESET_MODE": "PRESET_MODE",
+}
 
+def __getattr__(name: str):
+    """Giữ nguyên `from config.settings import PAIR` / `settings.ACCOUNTS` như bản cũ."""
+    if name == "ACCOUNTS":
+        return get_accounts()
+    field = _ALIASES.get(name, name)
+    if field in Settings.__dataclass_fields__:
+        return getattr(settings(), field)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+# ----------------------- /config/settings.py -----------------------
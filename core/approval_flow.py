@@ -1,10 +1,13 @@
 # ----------------------- core/approval_flow.py -----------------------
 from __future__ import annotations
 
-import secrets
-from dataclasses import dataclass, asdict
-from datetime import datetime
-from typing import Optional, Literal
+import os
+import sys
+import time
+import random
+from datetime import datetime, timezone
+from enum import IntEnum
+from typing import Optional, Literal, TypedDict, Union
 
 from utils.storage import Storage  # giữ nguyên Storage của dự án
 
@@ -14,11 +17,46 @@ from utils.storage import Storage  # giữ nguyên Storage của dự án
 
 _KEY_PREFIX = "pending:"
 
-def _ps_key(pid: str) -> str:
-    return f"{_KEY_PREFIX}{pid}"
+def _ps_key(pid: str, _p: str = _KEY_PREFIX) -> str:
+    # nối chuỗi trực tiếp (prefix bind sẵn vào default arg), không qua f-string
+    return _p + pid
 
-@dataclass
-class ManualPendingRecord:
+# pid chỉ là token UI ngắn hạn (không phải secret) → PRNG seed 1 lần từ os.urandom,
+# tránh syscall urandom mỗi lần tạo pending.
+_rng = random.Random()
+_rng.seed(os.urandom(16))
+
+def _short_pid() -> str:
+    return f"{_rng.getrandbits(24):06x}"  # ví dụ: 'ea8860'
+
+# memo chuỗi created_at theo giây (burst approve/pending trong cùng 1 giây dùng lại)
+_last_ts = [0, ""]
+
+def _iso_now() -> str:
+    s = int(time.time())
+    if s != _last_ts[0]:
+        # aware UTC ('...+00:00'); /approve đọc bằng fromisoformat, đã xử lý cả chuỗi có tz
+        _last_ts[:] = [s, datetime.fromtimestamp(s, timezone.utc).isoformat()]
+    return _last_ts[1]
+
+class Status(IntEnum):
+    """Trạng thái pending, lưu dạng int trong storage."""
+    PENDING = 0
+    APPROVED = 1
+    REJECTED = 2
+    EXPIRED_TIDE = 3
+
+    @classmethod
+    def parse(cls, v) -> Optional["Status"]:
+        """Đọc cả int (mới) lẫn chuỗi "APPROVED"/... (record cũ). Không hợp lệ → None."""
+        try:
+            if isinstance(v, str):
+                return cls[v.strip().upper()]
+            return cls(v)
+        except (KeyError, ValueError):
+            return None
+
+class ManualPendingRecord(TypedDict):
     pid: str
     created_at: str
     symbol: str
@@ -29,8 +67,8 @@ class ManualPendingRecord:
     risk_cfg: dict
     accounts_cfg: dict
     gates: dict                      # tide/late/m5 verdicts (optional)
-    origin: Literal["MANUAL"] = "MANUAL"
-    status: Literal["PENDING", "APPROVED", "REJECTED"] = "PENDING"
+    origin: Literal["MANUAL"]
+    status: int                      # Status.value
 
 def create_pending_v2(storage: Storage, payload: dict) -> ManualPendingRecord:
     """
@@ -38,32 +76,31 @@ def create_pending_v2(storage: Storage, payload: dict) -> ManualPendingRecord:
     payload bắt buộc: symbol, suggested_side
     payload tùy chọn: signal_frames, boardcard_ctx, qty_cfg, risk_cfg, accounts_cfg, gates, pid
     """
-    pid = payload.get("pid") or secrets.token_hex(3)  # ví dụ: 'ea8860'
-    rec = ManualPendingRecord(
-        pid=pid,
-        created_at=datetime.utcnow().isoformat(),
-        symbol=payload["symbol"],
-        suggested_side=str(payload["suggested_side"]).upper(),
-        signal_frames=payload.get("signal_frames", {}),
-        boardcard_ctx=payload.get("boardcard_ctx", {}),
-        qty_cfg=payload.get("qty_cfg", {}),
-        risk_cfg=payload.get("risk_cfg", {}),
-        accounts_cfg=payload.get("accounts_cfg", {}),
-        gates=payload.get("gates", {}),
-    )
-    storage.set(_ps_key(pid), asdict(rec))
+    pid = str(payload.get("pid") or _short_pid())
+    # dict thuần: lưu thẳng vào storage, không qua dataclass + asdict (deepcopy)
+    rec: ManualPendingRecord = {
+        "pid": pid,
+        "created_at": _iso_now(),
+        "symbol": payload["symbol"],
+        "suggested_side": sys.intern(str(payload["suggested_side"]).upper()),
+        "signal_frames": payload.get("signal_frames", {}),
+        "boardcard_ctx": payload.get("boardcard_ctx", {}),
+        "qty_cfg": payload.get("qty_cfg", {}),
+        "risk_cfg": payload.get("risk_cfg", {}),
+        "accounts_cfg": payload.get("accounts_cfg", {}),
+        "gates": payload.get("gates", {}),
+        "origin": "MANUAL",
+        "status": Status.PENDING.value,
+    }
+    storage.set(_ps_key(pid), rec)
     return rec
 
-def get_pending(storage: Storage, pid: str) -> Optional[ManualPendingRecord]:
-    raw = storage.get(_ps_key(pid))
-    if not raw:
-        return None
-    return ManualPendingRecord(**raw)
+def get_pending_raw(storage: Storage, pid: str) -> Optional[dict]:
+    """Trả thẳng dict trong storage (không copy/chuẩn hoá) cho đường nóng chỉ đọc vài field."""
+    return storage.get(_ps_key(pid)) or None
 
-def mark_done(storage: Storage, pid: str, status: Literal["APPROVED", "REJECTED"]) -> bool:
-    raw = storage.get(_ps_key(pid))
-    if not raw:
+def mark_done(storage: Storage, pid: str, status: Union[Status, str]) -> bool:
+    st = Status.parse(status)
+    if st is None:
         return False
-    raw["status"] = status
-    storage.set(_ps_key(pid), raw)
-    return True
+    return storage.patch(_ps_key(pid), status=st.value)
@@ -2,46 +2,64 @@
 from __future__ import annotations
 
 import os
+import json
+import time
+import sqlite3
+import threading
+import bisect
 import asyncio
-from dataclasses import dataclass
+import functools
+import importlib
+from dataclasses import dataclass, field
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta, timezone
-from core.approval_flow import create_pending_v2, get_pending, mark_done
+import logging
+try:
+    import orjson  # [ADD] parse ACCOUNTS_JSON nhanh hơn; fallback stdlib json
+except ImportError:
+    orjson = None  # type: ignore
+from core.approval_flow import create_pending_v2, get_pending_raw, mark_done, Status
 from core.tide_gate import TideGateConfig, tide_gate_check, bump_counters_after_execute
 
 
 # ========= Imports đồng bộ với /report =========
-# Lấy KẾT QUẢ CHUẨN H4/M30/Moon từ strategy.signal_generator.evaluate_signal()
-try:
-    from strategy.signal_generator import evaluate_signal  # trả về dict: ok, skip, signal, confidence, text, frames
-except Exception:
-    # fallback nếu cấu trúc dự án khác
-    from signal_generator import evaluate_signal  # type: ignore
+# [MOD] Resolver dùng chung: thử lần lượt từng module (fallback khi cấu trúc dự án khác),
+# lấy thuộc tính đầu tiên có; không có default → ImportError như import thường.
+_NO_DEFAULT = object()
 
+def _resolve(paths: Tuple[str, ...], name: str, default: Any = _NO_DEFAULT) -> Any:
+    for path in paths:
+        try:
+            return getattr(importlib.import_module(path), name)
+        except Exception:
+            continue
+    if default is _NO_DEFAULT:
+        raise ImportError(f"cannot import {name} from {' / '.join(paths)}")
+    return default
+
+# Lấy KẾT QUẢ CHUẨN H4/M30/Moon từ strategy.signal_generator.evaluate_signal()
+# → dict: ok, skip, signal, confidence, text, frames
+evaluate_signal = _resolve(("strategy.signal_generator", "signal_generator"), "evaluate_signal")
 # Moon/tide helpers (để log thêm late-window, TP-by-time)
+get_tide_events = _resolve(("data.moon_tide",), "get_tide_events", None)
+# M5 gate: vẫn giữ để kiểm soát cuối cùng nếu cần
+m5_entry_check = _resolve(("strategy.m5_strategy",), "m5_entry_check", None)
+# [ADD] Hub thống nhất
+execute_order_flow = _resolve(("core.trade_executor", "trade_executor"), "execute_order_flow")
+# pytz tz cho boardcard
+_UT_VN_TZ = _resolve(("utils.time_utils",), "VN_TZ", None)
+
+# [ADD] resolve 1 lần lúc import (trước đây import trong hàm mỗi lần gọi)
 try:
-    from data.moon_tide import get_tide_events
+    from config import settings as _S
 except Exception:
-    get_tide_events = None  # type: ignore
+    _S = None  # type: ignore
 
 # Tham số cửa sổ thủy triều mặc định (có thể đổi qua /tidewindow)
-try:
-    from config.settings import TIDE_WINDOW_HOURS
-except Exception:
+TIDE_WINDOW_HOURS = _resolve(("config.settings",), "TIDE_WINDOW_HOURS", None)
+if TIDE_WINDOW_HOURS is None:
     TIDE_WINDOW_HOURS = float(os.getenv("TIDE_WINDOW_HOURS", "2.5"))
 
-# M5 gate: vẫn giữ để kiểm soát cuối cùng nếu cần
-try:
-    from strategy.m5_strategy import m5_entry_check
-except Exception:
-    m5_entry_check = None  # type: ignore
-    
-# [ADD] Hub + formatter thống nhất
-try:
-    from core.trade_executor import execute_order_flow
-except Exception:
-    from trade_executor import execute_order_flow  # type: ignore
-
 try:
     from tg.formatter import render_executed_boardcard, render_signal_preview   # Cần theo dõi để cải thiện
 except Exception:
@@ -61,10 +79,12 @@ except Exception:
 
 # Thực thi lệnh (nếu có kết nối sàn)
 ExchangeClient = calc_qty = auto_sl_by_leverage = None
+_get_exchange = None
 for path in ("core.trade_executor", "trade_executor"):
     try:
-        mod = __import__(path, fromlist=["ExchangeClient", "calc_qty", "auto_sl_by_leverage"])
+        mod = __import__(path, fromlist=["ExchangeClient", "calc_qty", "auto_sl_by_leverage", "_get_exchange"])
         ExchangeClient = getattr(mod, "ExchangeClient", None)
+        _get_exchange = getattr(mod, "_get_exchange", None) or ExchangeClient  # pool nếu có
         calc_qty = getattr(mod, "calc_qty", None)
         auto_sl_by_leverage = getattr(mod, "auto_sl_by_leverage", None)
         if ExchangeClient and calc_qty and auto_sl_by_leverage:
@@ -73,10 +93,11 @@ for path in ("core.trade_executor", "trade_executor"):
         continue
 
 # ========= Timezone =========
+# [MOD] zoneinfo (stdlib, C) thay pytz; thiếu tzdata → fallback offset cố định
 try:
-    import pytz
-    VN_TZ = pytz.timezone("Asia/Ho_Chi_Minh")
-    JST   = pytz.timezone("Asia/Tokyo")
+    from zoneinfo import ZoneInfo
+    VN_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+    JST   = ZoneInfo("Asia/Tokyo")
 except Exception:
     VN_TZ = timezone(timedelta(hours=7))  # fallback
     JST   = timezone(timedelta(hours=9))
@@ -87,19 +108,253 @@ def now_vn() -> datetime:
     except Exception:
         return datetime.utcnow() + timedelta(hours=7)
 
+# [ADD] memo chuỗi isoformat theo giây (last_update của risk sentinel gọi mỗi tick)
+_last_iso_vn = [0, ""]
+
+def _iso_now_vn() -> str:
+    s = int(time.time())
+    if s != _last_iso_vn[0]:
+        _last_iso_vn[:] = [s, datetime.fromtimestamp(s, VN_TZ).isoformat()]
+    return _last_iso_vn[1]
+
+# [ADD] tương tự cho dạng 'YYYY-mm-dd HH:MM:SS' (log lỗi: N uid lỗi cùng giây → strftime 1 lần)
+_last_ts_vn = [0, ""]
+
+def _ts_now_vn() -> str:
+    s = int(time.time())
+    if s != _last_ts_vn[0]:
+        _last_ts_vn[:] = [s, datetime.fromtimestamp(s, VN_TZ).strftime("%Y-%m-%d %H:%M:%S")]
+    return _last_ts_vn[1]
+
+# [ADD] cache chuỗi thời gian theo epoch (+offset tz): N uid trong cùng tick → strftime 1 lần.
+# datetime naive → strftime thẳng (timestamp() của naive phụ thuộc tz máy).
+_DAY_STR_CACHE: Dict[Tuple[int, int], str] = {}
+_HHMM_CACHE: Dict[Tuple[int, int], str] = {}
+_last_fast_ts: List[Any] = [None, ""]
+
+def _epoch_off(dt: datetime) -> Tuple[int, int]:
+    off = dt.utcoffset()
+    return int(dt.timestamp()), (int(off.total_seconds()) if off else 0)
+
+def _fast_day(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        return dt.strftime("%Y-%m-%d")
+    ts, off = _epoch_off(dt)
+    k = ((ts + off) // 86400, off)
+    s = _DAY_STR_CACHE.get(k)
+    if s is None:
+        if len(_DAY_STR_CACHE) > 256:
+            _DAY_STR_CACHE.clear()
+        s = _DAY_STR_CACHE[k] = dt.strftime("%Y-%m-%d")
+    return s
+
+def _fast_hhmm(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        return dt.strftime("%H:%M")
+    ts, off = _epoch_off(dt)
+    k = (ts // 60, off)
+    s = _HHMM_CACHE.get(k)
+    if s is None:
+        if len(_HHMM_CACHE) > 256:
+            _HHMM_CACHE.clear()
+        s = _HHMM_CACHE[k] = dt.strftime("%H:%M")
+    return s
+
+def _fast_ts(dt: datetime) -> str:
+    """'YYYY-mm-dd HH:MM:SS' của dt; memo 1 ô theo (giây, offset)."""
+    if dt.tzinfo is None:
+        return dt.strftime("%Y-%m-%d %H:%M:%S")
+    k = _epoch_off(dt)
+    if _last_fast_ts[0] != k:
+        _last_fast_ts[:] = [k, dt.strftime("%Y-%m-%d %H:%M:%S")]
+    return _last_fast_ts[1]
+
+# [ADD] Lỗi bị nuốt ở các nhánh I/O: đếm theo site + log debug (xem /autostats)
+_log = logging.getLogger(__name__)
+_err_counter: Dict[str, int] = {}
+
+def _note_err(site: str, err: object = None) -> None:
+    # err: lỗi/mô tả khi không nằm trong except (vd. Telegram trả ok=false)
+    _err_counter[site] = _err_counter.get(site, 0) + 1
+    if err is None:
+        _log.debug("auto_engine:%s", site, exc_info=AUTO_DEBUG)
+    else:
+        _log.debug("auto_engine:%s %s", site, err, exc_info=AUTO_DEBUG)
+
+def get_error_stats() -> Dict[str, int]:
+    """Snapshot số lỗi đã nuốt theo site (cho /autostats)."""
+    return dict(_err_counter)
+
 # ========= Helpers chung =========
 def _floor_5m_epoch(ts: int) -> int:
     return ts // 300
 
-def _one_line(tag: str, reason: str, now: datetime, extra: str = "") -> str:
-    t = now.strftime("%Y-%m-%d %H:%M:%S")
+def _one_line(tag: str, reason: str, now, extra: str = "") -> str:
+    # now: datetime hoặc chuỗi đã format sẵn (t_iso của tick) → khỏi strftime lại
+    # [MOD] nhánh datetime cũng đi qua memo theo giây của _fast_ts
+    t = now if isinstance(now, str) else _fast_ts(now)
     return f"[{tag}] {t} | {reason} | {extra}".strip()
 
 async def _debug_send(app, uid: int, text: str) -> None:
     try:
         await app.bot.send_message(chat_id=uid, text=text)
+    except Exception as e:
+        _note_err("debug_send", e)
+
+# [ADD] Debug là best-effort → chạy nền, không bắt quyết định chờ round-trip Telegram.
+# Giữ ref task trong set (tránh bị GC khi đang chạy).
+_bg_tasks: set = set()
+_BG_MAX = 256
+
+# [MOD] Gom tin debug theo chat: đợi DEBUG_FLUSH_MS rồi nối bằng '\n' (≤ 4096 ký tự/tin)
+# → 1 send_message/chat/nhịp thay vì 1 tin/sự kiện, tránh 429 của Telegram.
+_TG_MAX_LEN = 4096
+_DEBUG_FLUSH_SEC = max(0.0, float(os.getenv("DEBUG_FLUSH_MS", "500") or 500) / 1000.0)
+_dbg_queue: Optional[asyncio.Queue] = None
+_dbg_flusher: Optional[asyncio.Task] = None
+
+def _chunk_lines(lines: List[str], limit: int = _TG_MAX_LEN, sep: str = "\n", cut: bool = True) -> List[str]:
+    # cut=False: tin dài hơn limit đi riêng, không cắt (HTML cắt giữa thẻ sẽ hỏng)
+    out: List[str] = []
+    buf = ""
+    for ln in lines:
+        if cut:
+            ln = ln[:limit]
+        if buf and len(buf) + len(sep) + len(ln) > limit:
+            out.append(buf)
+            buf = ln
+        else:
+            buf = f"{buf}{sep}{ln}" if buf else ln
+    if buf:
+        out.append(buf)
+    return out
+
+async def _debug_flush_loop(app, q: asyncio.Queue) -> None:
+    try:
+        from telegram.error import RetryAfter  # type: ignore
     except Exception:
-        pass
+        RetryAfter = None  # type: ignore
+    while True:
+        first = await q.get()
+        await asyncio.sleep(_DEBUG_FLUSH_SEC)
+        by_chat: Dict[int, List[str]] = {}
+        item = first
+        while True:
+            by_chat.setdefault(item[0], []).append(item[1])
+            try:
+                item = q.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+        for cid, lines in by_chat.items():
+            for text in _chunk_lines(lines):
+                try:
+                    await app.bot.send_message(chat_id=cid, text=text)
+                except Exception as e:
+                    if RetryAfter is not None and isinstance(e, RetryAfter):
+                        # bị throttle → chờ đúng retry_after rồi gửi lại 1 lần
+                        ra = getattr(e, "retry_after", 1)
+                        await asyncio.sleep(ra.total_seconds() if hasattr(ra, "total_seconds") else float(ra))
+                        await _debug_send(app, cid, text)
+                    else:
+                        _note_err("debug_send", e)
+
+# [ADD] Tin thông báo (lock/pending/TP/execute log) gửi nền, không nằm trên đường quyết định
+async def _safe_send(app, chat_id: int, text: str, **kw) -> None:
+    try:
+        await app.bot.send_message(chat_id=chat_id, text=text, **kw)
+    except Exception:
+        _note_err("tg_send")
+
+def _spawn_send(app, chat_id: int, text: str, **kw) -> None:
+    # PTB v20: Application.create_task gắn vòng đời task vào app (được await khi shutdown)
+    coro = _safe_send(app, chat_id, text, **kw)
+    ct = getattr(app, "create_task", None)
+    if callable(ct):
+        try:
+            ct(coro)
+            return
+        except Exception:
+            pass
+    t = asyncio.create_task(coro)
+    _bg_tasks.add(t)
+    t.add_done_callback(_bg_tasks.discard)
+
+# [ADD] Outbox cho tin thông báo (execute log / lock / pending / TP / broadcast): gom theo
+# (app, chat, kwargs) mỗi TG_OUTBOX_FLUSH_MS, nối bằng _OUTBOX_SEP (≤ _OUTBOX_LIMIT ký tự/tin)
+# → nhiều uid cùng tick không bắn N request riêng vào giới hạn ~30 msg/s của bot.
+_OUTBOX_SEP = "\n━━━\n"
+_OUTBOX_LIMIT = 3900
+_OUTBOX_FLUSH_SEC = max(0.0, float(os.getenv("TG_OUTBOX_FLUSH_MS", "400") or 400) / 1000.0)
+_tg_outbox: Optional[asyncio.Queue] = None
+_tg_sender: Optional[asyncio.Task] = None
+_BCAST_CHAT = object()  # đích "broadcast group" trong outbox (gửi qua _broadcast_send)
+
+async def _outbox_loop(q: asyncio.Queue) -> None:
+    try:
+        from telegram.error import RetryAfter  # type: ignore
+    except Exception:
+        RetryAfter = None  # type: ignore
+    while True:
+        first = await q.get()
+        await asyncio.sleep(_OUTBOX_FLUSH_SEC)
+        groups: Dict[tuple, List[str]] = {}
+        item = first
+        while True:
+            groups.setdefault(item[0], []).append(item[1])
+            try:
+                item = q.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+        for (app, chat_id, kw), texts in groups.items():
+            kwd = dict(kw)
+            for text in _chunk_lines(texts, _OUTBOX_LIMIT, _OUTBOX_SEP, cut=False):
+                for _ in range(2):
+                    try:
+                        if chat_id is _BCAST_CHAT:
+                            await _broadcast_send(text)
+                        else:
+                            await app.bot.send_message(chat_id=chat_id, text=text, **kwd)
+                    except Exception as e:
+                        if RetryAfter is not None and isinstance(e, RetryAfter):
+                            # bị throttle → chờ đúng retry_after rồi gửi lại 1 lần
+                            ra = getattr(e, "retry_after", 1)
+                            await asyncio.sleep(ra.total_seconds() if hasattr(ra, "total_seconds") else float(ra))
+                            continue
+                        _note_err("tg_outbox", e)
+                    break
+                else:
+                    # [ADD] bị throttle cả 2 lần → tin bị bỏ, ghi nhận để không mất im lặng
+                    _note_err("tg_outbox_drop", f"chat={chat_id!r} len={len(text)}")
+
+def _outbox_put(key: tuple, text: str) -> None:
+    global _tg_outbox, _tg_sender
+    if _tg_sender is None or _tg_sender.done():
+        _tg_outbox = asyncio.Queue()
+        _tg_sender = asyncio.create_task(_outbox_loop(_tg_outbox))
+    _tg_outbox.put_nowait((key, text))  # type: ignore[union-attr]
+
+def _send_bg(app, chat_id: int, text: str, **kw) -> None:
+    try:
+        key = (app, chat_id, tuple(sorted(kw.items())))
+        hash(key)
+    except TypeError:
+        # kwargs không hash được (vd. reply_markup) → gửi riêng như cũ
+        _spawn_send(app, chat_id, text, **kw)
+        return
+    _outbox_put(key, text)
+
+def _debug_send_bg(app, uid: int, text: str) -> None:
+    global _dbg_queue, _dbg_flusher
+    # [MOD] AUTO_DEBUG tắt → không tạo task gửi (tin SKIP vẫn lưu cho /autolog)
+    if not AUTO_DEBUG:
+        return
+    if _dbg_flusher is None or _dbg_flusher.done():
+        _dbg_queue = asyncio.Queue(maxsize=_BG_MAX)
+        _dbg_flusher = asyncio.create_task(_debug_flush_loop(app, _dbg_queue))
+    try:
+        _dbg_queue.put_nowait((uid, text))  # type: ignore[union-attr]
+    except asyncio.QueueFull:
+        pass  # quá _BG_MAX tin chờ → bỏ tin debug
 
 # [ADD] Chuẩn hoá side về 'buy'/'sell' cho an toàn (dùng nếu cần ở nơi khác)
 def _norm_side_txt(side_long_or_str) -> str:
@@ -118,21 +373,24 @@ def _side_txt_from_bool(side_long: bool) -> str:
     return "LONG" if bool(side_long) else "SHORT"
 
 # ========= [ADD] Broadcast helpers (đồng bộ format với /order) =========
-import html as _html
 from typing import cast
 try:
     from telegram import Bot as _TGBot  # python-telegram-bot (async)
 except Exception:
     _TGBot = None  # type: ignore
+_RetryAfter = _resolve(("telegram.error",), "RetryAfter", None)
+
+# [MOD] escape HTML bằng 1 lượt str.translate (html.escape = 3 lượt replace); quote=False như cũ
+_HTML_TRANS = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
 
 def _esc(s: object) -> str:
-    try:
-        return _html.escape(str(s or ""), quote=False)
-    except Exception:
-        return str(s)
+    return ("" if s is None else str(s)).translate(_HTML_TRANS)
 
 _TELEGRAM_BROADCAST_BOT_TOKEN = (os.getenv("TELEGRAM_BROADCAST_BOT_TOKEN") or "").strip()
 _TELEGRAM_BROADCAST_CHAT_ID   = (os.getenv("TELEGRAM_BROADCAST_CHAT_ID") or "").strip()
+# [ADD] ép kiểu chat_id 1 lần lúc import (trước đây int(...) mỗi lần gửi); "@channel" giữ nguyên chuỗi
+_BCAST_CHAT_ID = (int(_TELEGRAM_BROADCAST_CHAT_ID)
+                  if _TELEGRAM_BROADCAST_CHAT_ID.lstrip("-").isdigit() else _TELEGRAM_BROADCAST_CHAT_ID)
 __bcast_bot = None
 if _TGBot and _TELEGRAM_BROADCAST_BOT_TOKEN:
     try:
@@ -140,19 +398,86 @@ if _TGBot and _TELEGRAM_BROADCAST_BOT_TOKEN:
     except Exception:
         __bcast_bot = None
 
+# [ADD] Broadcast qua 1 httpx.AsyncClient sống lâu (keep-alive, HTTP/2 nếu có gói h2):
+# không bắt tay TLS lại mỗi lần, bỏ qua lớp dispatch của PTB. Thiếu httpx → dùng Bot như cũ.
+try:
+    import httpx
+except ImportError:
+    httpx = None  # type: ignore
+try:
+    import h2  # noqa: F401  (httpx[http2])
+    _BCAST_HTTP2 = True
+except ImportError:
+    _BCAST_HTTP2 = False
+_bcast_client = None
+
+def _get_bcast_client():
+    global _bcast_client
+    if _bcast_client is None or _bcast_client.is_closed:
+        _bcast_client = httpx.AsyncClient(
+            http2=_BCAST_HTTP2,
+            timeout=5.0,
+            limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+        )
+    return _bcast_client
+
+async def close_broadcast_client() -> None:
+    """Đóng client broadcast (gọi lúc app shutdown)."""
+    global _bcast_client
+    if _bcast_client is not None:
+        try:
+            await _bcast_client.aclose()
+        except Exception:
+            pass
+        _bcast_client = None
+
 async def _broadcast_html(text: str) -> None:
-    """Gửi HTML vào broadcast group. Im lặng nếu thiếu token/chat id."""
-    if not (__bcast_bot and _TELEGRAM_BROADCAST_CHAT_ID):
+    """Đưa HTML vào outbox broadcast (gửi gộp nền). Im lặng nếu thiếu token/chat id."""
+    if not (_TELEGRAM_BROADCAST_BOT_TOKEN and _TELEGRAM_BROADCAST_CHAT_ID):
+        return
+    _outbox_put((None, _BCAST_CHAT, ()), text)
+
+async def _broadcast_send(text: str) -> None:
+    """
+    Gửi HTML vào broadcast group (gọi từ _outbox_loop).
+    Bị throttle → raise RetryAfter để _outbox_loop chờ rồi gửi lại; lỗi khác → đếm vào /autostats.
+    """
+    if httpx is not None:
+        try:
+            resp = await _get_bcast_client().post(
+                f"https://api.telegram.org/bot{_TELEGRAM_BROADCAST_BOT_TOKEN}/sendMessage",
+                json={
+                    "chat_id": _BCAST_CHAT_ID,
+                    "text": text,
+                    "parse_mode": "HTML",
+                    "disable_web_page_preview": True,
+                },
+            )
+            data = resp.json()
+        except Exception:
+            _note_err("bcast_http")
+            return
+        # Bot API trả lỗi (429/400/403) dưới dạng response thường: {"ok": false, ...}
+        if isinstance(data, dict) and data.get("ok"):
+            return
+        params = (data.get("parameters") if isinstance(data, dict) else None) or {}
+        if params.get("retry_after") is not None and _RetryAfter is not None:
+            raise _RetryAfter(int(params["retry_after"]))
+        _note_err("bcast_http", f"HTTP {resp.status_code}: {data.get('description') if isinstance(data, dict) else data}")
+        return
+    if not __bcast_bot:
         return
     try:
         await cast(_TGBot, __bcast_bot).send_message(
-            chat_id=int(_TELEGRAM_BROADCAST_CHAT_ID),
+            chat_id=_BCAST_CHAT_ID,
             text=text,
             parse_mode="HTML",
             disable_web_page_preview=True,
         )
-    except Exception:
-        pass
+    except Exception as e:
+        if _RetryAfter is not None and isinstance(e, _RetryAfter):
+            raise
+        _note_err("bcast_bot", e)
 
 # ================== Broadcast tín hiệu  ==================
 def _fmt_exec_broadcast(
@@ -167,11 +492,6 @@ def _fmt_exec_broadcast(
     - Các field risk/lev/qty/entry_spot có thể None -> sẽ tự ẩn.
     - entry_ids & tp_time là tùy chọn (nếu có sẽ in thêm).
     """
-    import html as _html
-    def _esc(x):
-        try: return _html.escape("" if x is None else str(x), quote=False)
-        except: return str(x)
-
     lines: list[str] = []
     lines.append(f"🚀 <b>EXECUTED</b> | <b>{_esc(pair)}</b> <b>{_esc(str(side).upper())}</b>")
     lines.append(f"• Mode: {mode_label}")
@@ -202,11 +522,11 @@ def _fmt_exec_broadcast(
         if tp_time is not None:
             dt = tp_time
             try:
-                from utils.time_utils import VN_TZ  # nếu có
-                if getattr(dt, "tzinfo", None) is None:
-                    dt = VN_TZ.localize(dt)
-                else:
-                    dt = dt.astimezone(VN_TZ)
+                if _UT_VN_TZ is not None:
+                    if getattr(dt, "tzinfo", None) is None:
+                        dt = _UT_VN_TZ.localize(dt)
+                    else:
+                        dt = dt.astimezone(_UT_VN_TZ)
             except Exception:
                 pass
             # dt có thể là datetime hoặc string
@@ -232,6 +552,20 @@ def _fmt_exec_broadcast(
 
     
 
+async def _emit_broadcast(**kw) -> None:
+    """Task nền: Entry(SPOT) để hiển thị đẹp → _fmt_exec_broadcast → outbox broadcast. Lỗi → bỏ qua."""
+    try:
+        # helper tự nuốt lỗi, trả 0.0 khi không lấy được; chạy thread vì get_klines là REST đồng bộ
+        entry_spot = await asyncio.to_thread(_cached_spot_entry, kw["pair"])
+        await _broadcast_html(_fmt_exec_broadcast(entry_spot=entry_spot, **kw))
+    except Exception:
+        _note_err("bcast_emit")
+
+@functools.lru_cache(maxsize=1024)
+def _clean_pair(pair: str) -> str:
+    """'BTC/USDT:USDT' → 'BTC/USDT' (hiển thị); số pair ít → cache theo chuỗi."""
+    return pair.replace(":USDT", "")
+
 def _binance_spot_entry(pair: str) -> float:
     """Lấy giá hiển thị SPOT (Binance) để boardcard. Không dùng cho khớp lệnh."""
     try:
@@ -241,15 +575,49 @@ def _binance_spot_entry(pair: str) -> float:
         if df is not None and len(df) > 0:
             return float(df.iloc[-1]["close"])
     except Exception:
-        pass
+        _note_err("spot_entry")
     return 0.0
 
+# [ADD] TTL cache giá theo pair (ngắn hơn 1 tick): nhiều uid cùng pair trong 1 tick → 1 request REST
+_SPOT_TTL = float(os.getenv("SPOT_PRICE_TTL_SEC", "3") or 3)
+_spot_entry_cache: Dict[str, Tuple[float, float]] = {}   # pair -> (monotonic, price) giá SPOT hiển thị
+_last_price_cache: Dict[str, Tuple[float, float]] = {}   # pair -> (monotonic, last) ticker futures
+
+def _cached_spot_entry(pair: str) -> float:
+    hit = _spot_entry_cache.get(pair)
+    t = time.monotonic()
+    if hit is not None and t - hit[0] < _SPOT_TTL:
+        return hit[1]
+    px = _binance_spot_entry(pair)
+    if px > 0:  # 0.0 = lỗi → không cache, lần sau thử lại
+        _spot_entry_cache[pair] = (t, px)
+    return px
+
+async def _cached_last_price(ex, pair: str) -> Optional[float]:
+    hit = _last_price_cache.get(pair)
+    t = time.monotonic()
+    if hit is not None and t - hit[0] < _SPOT_TTL:
+        return hit[1]
+    ticker = await ex._io(ex.client.fetch_ticker, pair)
+    px = float(ticker.get("last") or ticker.get("close") or 0.0)
+    if px > 0:
+        _last_price_cache[pair] = (t, px)
+    return px
+
 # ========= ENV & runtime knobs (có thể đổi bằng /setenv hoặc preset) =========
-def _env_bool(key: str, default: str = "false") -> bool:
-    return (os.getenv(key, default) or "").strip().lower() in ("1", "true", "yes", "on", "y")
+_TRUTHY = frozenset({"1", "true", "yes", "on", "y"})
+
+def _env_bool(key: str, default: "str | bool" = "false") -> bool:
+    # [MOD] thiếu key + default là bool → trả thẳng, khỏi dựng chuỗi "true"/"false" rồi strip/lower lại
+    v = os.getenv(key)
+    if v is None:
+        return default if isinstance(default, bool) else default in _TRUTHY
+    return v.strip().lower() in _TRUTHY
 
 M5_MAX_DELAY_SEC        = int(float(os.getenv("M5_MAX_DELAY_SEC", "60")))
 SCHEDULER_TICK_SEC      = int(float(os.getenv("SCHEDULER_TICK_SEC", "2")))
+# [ADD] trần nhịp tick khi rảnh (backoff x2 mỗi tick rảnh, không ngủ quá mốc đóng nến M5 kế tiếp)
+AUTO_MAX_TICK_SEC       = int(float(os.getenv("AUTO_MAX_TICK_SEC", "30")))
 
 # ⚠️ DEPRECATED: quota/window cũ ở Gate A (đã chuyển sang TideGate T)
 # MAX_TRADES_PER_WINDOW   = int(float(os.getenv("MAX_TRADES_PER_WINDOW", "2")))
@@ -263,6 +631,13 @@ AUTO_DEBUG_VERBOSE      = _env_bool("AUTO_DEBUG_VERBOSE", "false")
 AUTO_DEBUG_ONLY_WHEN_SKIP = _env_bool("AUTO_DEBUG_ONLY_WHEN_SKIP", "false")
 AUTO_DEBUG_CHAT_ID      = os.getenv("AUTO_DEBUG_CHAT_ID", "").strip()
 
+# [ADD] parse chat_id 1 lần (nhận cả id nhóm âm); None → gửi về uid
+def _parse_chat_id(raw) -> Optional[int]:
+    s = str(raw or "").strip()
+    return int(s) if s.lstrip("-").isdigit() else None
+
+_AUTO_DEBUG_CHAT_ID_INT: Optional[int] = _parse_chat_id(AUTO_DEBUG_CHAT_ID)
+
 # Rule: M5 buộc trùng hướng với M30 (anh có thể /setenv ENFORCE_M5_MATCH_M30 false để tắt)
 ENFORCE_M5_MATCH_M30 = _env_bool("ENFORCE_M5_MATCH_M30", "true")
 
@@ -276,6 +651,81 @@ M5_GAP_SCOPED_TO_WINDOW = True     # gap guard tính trong 1 cửa sổ tide hay
 ALLOW_SECOND_ENTRY = True          # cho phép vào lệnh thứ 2 trong cùng cửa sổ
 M5_SECOND_ENTRY_MIN_RETRACE_PCT = 0.1 # % tối thiểu retrace để cho lệnh thứ 2
 
+# [ADD] Snapshot các ENV đọc trong hot-path (gate/hub/TP-by-time) → không os.getenv mỗi tick.
+# Chỉ build lại khi /setenv hoặc preset gọi _apply_runtime_env.
+@dataclass(frozen=True, slots=True)
+class AutoCfg:
+    m30_stable_min_sec: int
+    m30_need_consec_n: int
+    m5_min_gap_min: int
+    m5_gap_scoped_to_window: bool
+    allow_second_entry: bool
+    second_entry_min_retrace_pct: float
+    tp_time_hours: float        # TP-by-time (mặc định 12h, kẹp 0.5..48)
+    tp_time_delta: timedelta    # = timedelta(hours=tp_time_hours), dựng sẵn cho timer/TP-by-time
+    tp_eta_hours: float         # ETA hiển thị ở Hub (mặc định 5.5h)
+    tide_window_hours: float
+    tp_rr_mult: float           # RR cho SL/TP sơ bộ (truyền thẳng vào auto_sl_by_leverage, khỏi getenv mỗi lệnh)
+    # TideGate (đọc ở mỗi tick auto qua _load_tidegate_config)
+    tg_tide_window_hours: float
+    tg_entry_late_only: bool
+    tg_entry_late_from: float
+    tg_entry_late_to: float
+    tg_max_per_day: int
+    tg_max_per_tide_window: int
+    tg_counter_scope: str
+    accounts_extra: Tuple[Dict[str, Any], ...]  # ACCOUNTS_JSON đã parse (Hub merge mỗi lệnh)
+
+def _build_cfg() -> AutoCfg:
+    def _f(key: str, default: float) -> float:
+        try:
+            return float(os.getenv(key, str(default)))
+        except Exception:
+            return default
+
+    def _i(key: str, default: int) -> int:
+        try:
+            return int(float(os.getenv(key, str(default))))
+        except Exception:
+            return default
+
+    try:
+        gap_min = int(float(os.getenv("M5_MIN_GAP_MIN", os.getenv("ENTRY_SEQ_WINDOW_MIN", "0"))))
+    except Exception:
+        gap_min = 0
+    scope_raw = (os.getenv("COUNTER_SCOPE", "per_user") or "per_user").strip().lower()
+    tp_hours = max(0.5, min(48.0, _f("TP_TIME_HOURS", 12.0)))
+    try:
+        j = os.getenv("ACCOUNTS_JSON")
+        arr = (orjson.loads(j) if orjson else json.loads(j)) if j else []
+        accounts_extra = tuple(a for a in arr if isinstance(a, dict)) if isinstance(arr, list) else ()
+    except Exception:
+        _note_err("accounts_json")
+        accounts_extra = ()
+    return AutoCfg(
+        m30_stable_min_sec = _i("M30_STABLE_MIN_SEC", M30_STABLE_MIN_SEC),
+        m30_need_consec_n  = max(1, _i("M30_NEED_CONSEC_N", M30_NEED_CONSEC_N)),
+        m5_min_gap_min     = gap_min,
+        m5_gap_scoped_to_window = _env_bool("M5_GAP_SCOPED_TO_WINDOW", "true"),
+        allow_second_entry = _env_bool("ALLOW_SECOND_ENTRY", "true"),
+        second_entry_min_retrace_pct = _f("M5_SECOND_ENTRY_MIN_RETRACE_PCT", 0.3),
+        tp_time_hours      = tp_hours,
+        tp_time_delta      = timedelta(hours=tp_hours),
+        tp_eta_hours       = _f("TP_TIME_HOURS", 5.5),
+        tide_window_hours  = _f("TIDE_WINDOW_HOURS", TIDE_WINDOW_HOURS),
+        tp_rr_mult         = _f("TP_RR_MULT", 2.0),
+        tg_tide_window_hours   = _f("TIDE_WINDOW_HOURS", 2.5),
+        tg_entry_late_only     = _env_bool("ENTRY_LATE_ONLY", "false"),
+        tg_entry_late_from     = _f("ENTRY_LATE_FROM_HRS", 0.5),
+        tg_entry_late_to       = _f("ENTRY_LATE_TO_HRS", 2.5),
+        tg_max_per_day         = _i("MAX_ORDERS_PER_DAY", 8),
+        tg_max_per_tide_window = _i("MAX_ORDERS_PER_TIDE_WINDOW", 2),
+        tg_counter_scope       = "per_user" if scope_raw in ("user", "per_user", "u", "p") else "global",
+        accounts_extra         = accounts_extra,
+    )
+
+_CFG = _build_cfg()
+
 
 def _apply_runtime_env(kv: Dict[str, str]) -> None:
     """
@@ -283,44 +733,62 @@ def _apply_runtime_env(kv: Dict[str, str]) -> None:
     Đồng bộ lại toàn bộ biến module để auto-loop áp dụng ngay.
     """
     global ENTRY_LATE_ONLY, ENTRY_LATE_FROM_HRS, ENTRY_LATE_TO_HRS
-    global AUTO_DEBUG, AUTO_DEBUG_VERBOSE, AUTO_DEBUG_ONLY_WHEN_SKIP, AUTO_DEBUG_CHAT_ID
+    global AUTO_DEBUG, AUTO_DEBUG_VERBOSE, AUTO_DEBUG_ONLY_WHEN_SKIP, AUTO_DEBUG_CHAT_ID, _AUTO_DEBUG_CHAT_ID_INT
     global ENFORCE_M5_MATCH_M30
     # Guards / filters mới:
     global M30_FLIP_GUARD, M30_STABLE_MIN_SEC, M30_NEED_CONSEC_N
     global M5_MIN_GAP_MIN, M5_GAP_SCOPED_TO_WINDOW, ALLOW_SECOND_ENTRY, M5_SECOND_ENTRY_MIN_RETRACE_PCT
+    global _CFG, _tp_wake
+
+    sv = {k: str(v) for k, v in kv.items()}
+    os.environ.update(sv)
 
-    for k, v in kv.items():
-        os.environ[k] = str(v)
+    # [MOD] key có trong kv → parse thẳng từ kv, không đọc lại os.environ vừa ghi;
+    # key khác vẫn lấy từ ENV (có thể đã đổi ở nơi khác), thiếu → giữ giá trị hiện tại
+    def _get(k: str, cur):
+        return sv[k] if k in sv else os.getenv(k, cur)
+
+    def _b(k: str, cur: bool) -> bool:
+        v = _get(k, None)
+        return cur if v is None else v.strip().lower() in _TRUTHY
 
     try:
         # late-window (⚠️ chỉ dùng để hiển thị; chặn thực tế đã gom vào TideGate)
-        ENTRY_LATE_ONLY         = _env_bool("ENTRY_LATE_ONLY", "true" if ENTRY_LATE_ONLY else "false")
-        ENTRY_LATE_FROM_HRS     = float(os.getenv("ENTRY_LATE_FROM_HRS", str(ENTRY_LATE_FROM_HRS)))
-        ENTRY_LATE_TO_HRS       = float(os.getenv("ENTRY_LATE_TO_HRS", str(ENTRY_LATE_TO_HRS)))
+        ENTRY_LATE_ONLY         = _b("ENTRY_LATE_ONLY", ENTRY_LATE_ONLY)
+        ENTRY_LATE_FROM_HRS     = float(_get("ENTRY_LATE_FROM_HRS", ENTRY_LATE_FROM_HRS))
+        ENTRY_LATE_TO_HRS       = float(_get("ENTRY_LATE_TO_HRS", ENTRY_LATE_TO_HRS))
 
         # debug
-        AUTO_DEBUG              = _env_bool("AUTO_DEBUG", "true" if AUTO_DEBUG else "false")
-        AUTO_DEBUG_VERBOSE      = _env_bool("AUTO_DEBUG_VERBOSE", "true" if AUTO_DEBUG_VERBOSE else "false")
-        AUTO_DEBUG_ONLY_WHEN_SKIP = _env_bool("AUTO_DEBUG_ONLY_WHEN_SKIP", "true" if AUTO_DEBUG_ONLY_WHEN_SKIP else "false")
-        AUTO_DEBUG_CHAT_ID      = os.getenv("AUTO_DEBUG_CHAT_ID", AUTO_DEBUG_CHAT_ID)
+        AUTO_DEBUG              = _b("AUTO_DEBUG", AUTO_DEBUG)
+        AUTO_DEBUG_VERBOSE      = _b("AUTO_DEBUG_VERBOSE", AUTO_DEBUG_VERBOSE)
+        AUTO_DEBUG_ONLY_WHEN_SKIP = _b("AUTO_DEBUG_ONLY_WHEN_SKIP", AUTO_DEBUG_ONLY_WHEN_SKIP)
+        AUTO_DEBUG_CHAT_ID      = _get("AUTO_DEBUG_CHAT_ID", AUTO_DEBUG_CHAT_ID)
+        _AUTO_DEBUG_CHAT_ID_INT = _parse_chat_id(AUTO_DEBUG_CHAT_ID)
 
         # rules
-        ENFORCE_M5_MATCH_M30    = _env_bool("ENFORCE_M5_MATCH_M30", "true" if ENFORCE_M5_MATCH_M30 else "false")
+        ENFORCE_M5_MATCH_M30    = _b("ENFORCE_M5_MATCH_M30", ENFORCE_M5_MATCH_M30)
 
         # guards M30/M5
-        M30_FLIP_GUARD          = _env_bool("M30_FLIP_GUARD", "true" if M30_FLIP_GUARD else "false")
-        M30_STABLE_MIN_SEC      = int(float(os.getenv("M30_STABLE_MIN_SEC", str(M30_STABLE_MIN_SEC))))
-        M30_NEED_CONSEC_N       = int(float(os.getenv("M30_NEED_CONSEC_N", str(M30_NEED_CONSEC_N))))
-        M5_MIN_GAP_MIN          = int(float(os.getenv("M5_MIN_GAP_MIN", str(M5_MIN_GAP_MIN))))
-        M5_GAP_SCOPED_TO_WINDOW = _env_bool("M5_GAP_SCOPED_TO_WINDOW", "true" if M5_GAP_SCOPED_TO_WINDOW else "false")
-        ALLOW_SECOND_ENTRY      = _env_bool("ALLOW_SECOND_ENTRY", "true" if ALLOW_SECOND_ENTRY else "false")
-        M5_SECOND_ENTRY_MIN_RETRACE_PCT = float(os.getenv("M5_SECOND_ENTRY_MIN_RETRACE_PCT", str(M5_SECOND_ENTRY_MIN_RETRACE_PCT)))
+        M30_FLIP_GUARD          = _b("M30_FLIP_GUARD", M30_FLIP_GUARD)
+        M30_STABLE_MIN_SEC      = int(float(_get("M30_STABLE_MIN_SEC", M30_STABLE_MIN_SEC)))
+        M30_NEED_CONSEC_N       = int(float(_get("M30_NEED_CONSEC_N", M30_NEED_CONSEC_N)))
+        M5_MIN_GAP_MIN          = int(float(_get("M5_MIN_GAP_MIN", M5_MIN_GAP_MIN)))
+        M5_GAP_SCOPED_TO_WINDOW = _b("M5_GAP_SCOPED_TO_WINDOW", M5_GAP_SCOPED_TO_WINDOW)
+        ALLOW_SECOND_ENTRY      = _b("ALLOW_SECOND_ENTRY", ALLOW_SECOND_ENTRY)
+        M5_SECOND_ENTRY_MIN_RETRACE_PCT = float(_get("M5_SECOND_ENTRY_MIN_RETRACE_PCT", M5_SECOND_ENTRY_MIN_RETRACE_PCT))
 
     except Exception:
         # Không crash auto loop nếu thiếu biến — chỉ bỏ qua cập nhật
         pass
+    _CFG = _build_cfg()
+    # timer TP-by-time đang ngủ → tính lại deadline theo TP_TIME_HOURS mới
+    _tp_wake.set()
+    _tp_wake = asyncio.Event()
+
+# bot.py (preset) gọi apply_runtime_overrides nếu có → dùng chung đường rebuild snapshot
+apply_runtime_overrides = _apply_runtime_env
 
-async def _load_tidegate_config(storage, uid=None) -> TideGateConfig:
+async def _load_tidegate_config(storage, uid=None, st=None) -> TideGateConfig:
     """
     Nạp cấu hình TideGate từ ENV + (tuỳ) user settings nếu có.
     Chuẩn hoá alias:
@@ -331,42 +799,23 @@ async def _load_tidegate_config(storage, uid=None) -> TideGateConfig:
       - ENTRY_LATE_FROM_HRS          -> entry_late_from
       - ENTRY_LATE_TO_HRS            -> entry_late_to
       - COUNTER_SCOPE ('per_user'|'global') -> counter_scope
+    [MOD] Giá trị ENV lấy từ snapshot _CFG (parse 1 lần, rebuild ở _apply_runtime_env).
+    [ADD] st: UserState đã đọc sẵn trong tick (nếu có) → không storage.get_user lần nữa.
     """
-    def _as_bool(s: str, default=False) -> bool:
-        if s is None:
-            return default
-        return str(s).strip().lower() in ("1", "true", "yes", "on", "y")
-
-    def _as_float(s: str, default: float) -> float:
-        try:
-            return float(s)
-        except Exception:
-            return default
-
-    def _as_int(s: str, default: int) -> int:
-        try:
-            return int(float(s))
-        except Exception:
-            return default
-
-    # defaults
-    tide_window_hours   = _as_float(os.getenv("TIDE_WINDOW_HOURS", "2.5"), 2.5)
-    entry_late_only     = _as_bool(os.getenv("ENTRY_LATE_ONLY", "false"), False)
-    entry_late_from     = _as_float(os.getenv("ENTRY_LATE_FROM_HRS", "0.5"), 0.5)
-    entry_late_to       = _as_float(os.getenv("ENTRY_LATE_TO_HRS",   "2.5"), 2.5)
-
-    # quota (alias)
-    max_per_day         = _as_int(os.getenv("MAX_ORDERS_PER_DAY", "8"), 8)
-    max_per_tide_window = _as_int(os.getenv("MAX_ORDERS_PER_TIDE_WINDOW", "2"), 2)
-
-    # scope
-    scope_raw           = (os.getenv("COUNTER_SCOPE", "per_user") or "per_user").strip().lower()
-    counter_scope       = "per_user" if scope_raw in ("user","per_user","u","p") else "global"
+    c = _CFG
+    tide_window_hours   = c.tg_tide_window_hours
+    entry_late_only     = c.tg_entry_late_only
+    entry_late_from     = c.tg_entry_late_from
+    entry_late_to       = c.tg_entry_late_to
+    max_per_day         = c.tg_max_per_day
+    max_per_tide_window = c.tg_max_per_tide_window
+    counter_scope       = c.tg_counter_scope
 
     # nếu có storage + user settings muốn override tide_window_hours theo user:
     try:
-        if storage is not None and uid is not None:
+        if st is None and storage is not None and uid is not None:
             st = storage.get_user(uid)
+        if st is not None:
             if hasattr(st.settings, "tide_window_hours") and st.settings.tide_window_hours:
                 tide_window_hours = float(st.settings.tide_window_hours)
     except Exception:
@@ -385,52 +834,158 @@ async def _load_tidegate_config(storage, uid=None) -> TideGateConfig:
     return cfg
 
 # ========= RISK-SENTINEL (Khoá AUTO nếu 2 SL liên tiếp ở 2 lần thủy triều khác nhau trong cùng ngày) =========
-AUTO_LOCK_ON_2_SL = (os.getenv("AUTO_LOCK_ON_2_SL", "true").strip().lower() in ("1","true","yes","on","y"))
-AUTO_LOCK_NOTIFY  = (os.getenv("AUTO_LOCK_NOTIFY", "true").strip().lower() in ("1","true","yes","on","y"))
+AUTO_LOCK_ON_2_SL = _env_bool("AUTO_LOCK_ON_2_SL", True)
+AUTO_LOCK_NOTIFY  = _env_bool("AUTO_LOCK_NOTIFY", True)
 _RS_STATE_KEY   = "risk_sentinel"
 _RS_STATE_FILE  = "risk_sentinel_state.json"
+# [MOD] Khi không có storage: SQLite (WAL) 1 dòng/ngày → đọc/ghi O(1) theo ngày, không rewrite cả file.
+# Lần đầu mở DB rỗng: import dữ liệu cũ (snapshot JSON + log JSONL) nếu còn.
+_RS_DB_FILE     = "risk_sentinel_state.db"
+_RS_EVENTS_FILE = "risk_sentinel_events.jsonl"   # định dạng cũ, chỉ đọc để migrate
+_rs_conn: Optional[sqlite3.Connection] = None
+_rs_db_lock = threading.Lock()
 
 def _rs_today_str(dt: Optional[datetime] = None) -> str:
     try:
-        return (dt or now_vn()).strftime("%Y-%m-%d")
+        return _fast_day(dt or now_vn())
     except Exception:
         return datetime.utcnow().strftime("%Y-%m-%d")
 
+def _rs_legacy_file_data() -> Dict[str, Any]:
+    """Đọc state file-mode cũ: snapshot + replay log (dòng sau ghi đè ngày tương ứng)."""
+    data: Dict[str, Any] = {}
+    try:
+        with open(_RS_STATE_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f) or {}
+    except Exception:
+        data = {}
+    try:
+        with open(_RS_EVENTS_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                    data[ev["day"]] = ev["state"]
+                except Exception:
+                    continue  # dòng hỏng (ghi dở) → bỏ qua
+    except OSError:
+        pass
+    return data
+
+def _rs_db() -> sqlite3.Connection:
+    global _rs_conn
+    if _rs_conn is None:
+        conn = sqlite3.connect(_RS_DB_FILE, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS rs(day TEXT PRIMARY KEY, payload TEXT NOT NULL)")
+        if conn.execute("SELECT 1 FROM rs LIMIT 1").fetchone() is None:
+            legacy = _rs_legacy_file_data()
+            if legacy:
+                _rs_db_put_many(conn, legacy)
+        _rs_conn = conn
+    return _rs_conn
+
+def _rs_dumps(st: Dict[str, Any]) -> str:
+    if orjson:
+        return orjson.dumps(st).decode()
+    return json.dumps(st, ensure_ascii=False)
+
+def _rs_loads(s: str) -> Dict[str, Any]:
+    if orjson:
+        return orjson.loads(s)
+    return json.loads(s)
+
+def _rs_db_put_many(conn: sqlite3.Connection, data: Dict[str, Any]) -> None:
+    conn.execute("BEGIN")
+    try:
+        conn.executemany(
+            "INSERT INTO rs(day, payload) VALUES(?, ?) ON CONFLICT(day) DO UPDATE SET payload=excluded.payload",
+            [(d, _rs_dumps(st)) for d, st in data.items() if isinstance(st, dict)],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+# [ADD] Write-through cache theo ngày cho file-mode: tick đọc trạng thái khoá không chạm SQLite.
+# day → payload (None = ngày chưa có bản ghi); chỉ giữ vài ngày gần nhất.
+_rs_day_cache: Dict[str, Optional[Dict[str, Any]]] = {}
+_RS_MISS = object()
+
+def _rs_cache_put(day: str, st: Optional[Dict[str, Any]]) -> None:
+    # gọi dưới _rs_db_lock: các thread to_thread (is_locked/on_trade_close) có thể chạy song song
+    _rs_day_cache[day] = st
+    while len(_rs_day_cache) > 3:
+        _rs_day_cache.pop(min(_rs_day_cache), None)
+
+def _rs_db_get(day: str) -> Optional[Dict[str, Any]]:
+    hit = _rs_day_cache.get(day, _RS_MISS)
+    if hit is _RS_MISS:
+        try:
+            with _rs_db_lock:
+                row = _rs_db().execute("SELECT payload FROM rs WHERE day=?", (day,)).fetchone()
+                hit = _rs_loads(row[0]) if row else None
+                _rs_cache_put(day, hit)
+        except Exception:
+            return None
+    # trả bản sao: caller (on_trade_close/status) sửa dict tại chỗ
+    return dict(hit) if hit is not None else None
+
+def _rs_db_set(day: str, st: Dict[str, Any]) -> None:
+    try:
+        with _rs_db_lock:
+            _rs_cache_put(day, dict(st))
+            _rs_db().execute(
+                "INSERT INTO rs(day, payload) VALUES(?, ?) ON CONFLICT(day) DO UPDATE SET payload=excluded.payload",
+                (day, _rs_dumps(st)),
+            )
+    except Exception:
+        _note_err("rs_db_set")
+
 def _rs_load_all(storage) -> Dict[str, Any]:
     if storage:
         data = getattr(storage, "get", lambda k: None)(_RS_STATE_KEY)
         return data if isinstance(data, dict) else {}
     try:
-        with open(_RS_STATE_FILE, "r", encoding="utf-8") as f:
-            import json as _json
-            return _json.load(f) or {}
+        with _rs_db_lock:
+            rows = _rs_db().execute("SELECT day, payload FROM rs").fetchall()
+        return {d: _rs_loads(p) for d, p in rows}
     except Exception:
         return {}
 
 def _rs_save_all(storage, data: Dict[str, Any]) -> None:
+    """storage: ghi cả dict; file-mode: upsert từng ngày trong 1 transaction."""
     if storage and hasattr(storage, "set"):
         storage.set(_RS_STATE_KEY, data)
         return
     try:
-        with open(_RS_STATE_FILE, "w", encoding="utf-8") as f:
-            import json as _json
-            _json.dump(data, f, ensure_ascii=False, indent=2)
+        with _rs_db_lock:
+            _rs_day_cache.clear()
+            _rs_db_put_many(_rs_db(), data)
     except Exception:
-        pass
+        _note_err("rs_save")
 
 def _rs_get_day(storage, day: str) -> Dict[str, Any]:
-    all_data = _rs_load_all(storage)
-    return all_data.get(day, {
+    if storage:
+        hit = _rs_load_all(storage).get(day)
+    else:
+        hit = _rs_db_get(day)
+    if hit is not None:
+        return hit
+    return {
         "sl_streak": 0,
         "last_result": None,
         "last_window_key": None,
         "locked": False,
-        "last_update": now_vn().isoformat() if callable(now_vn) else datetime.utcnow().isoformat(),
-    })
+        "last_update": _iso_now_vn(),
+    }
 
 def _rs_set_day(storage, day: str, st: Dict[str, Any]) -> None:
+    st["last_update"] = _iso_now_vn()
+    if not (storage and hasattr(storage, "set")):
+        _rs_db_set(day, st)
+        return
     all_data = _rs_load_all(storage)
-    st["last_update"] = (now_vn().isoformat() if callable(now_vn) else datetime.utcnow().isoformat())
     all_data[day] = st
     _rs_save_all(storage, all_data)
 
@@ -451,7 +1006,7 @@ def _rs_reset_today(storage) -> None:
     d = _rs_today_str()
     _rs_set_day(storage, d, {
         "sl_streak": 0, "last_result": None, "last_window_key": None,
-        "locked": False, "last_update": now_vn().isoformat() if callable(now_vn) else datetime.utcnow().isoformat()
+        "locked": False, "last_update": _iso_now_vn()
     })
 
 def _rs_on_trade_close(storage, *, result: str, window_key: Optional[str], when: Optional[datetime] = None) -> bool:
@@ -484,141 +1039,396 @@ def _rs_on_trade_close(storage, *, result: str, window_key: Optional[str], when:
 
     _rs_set_day(storage, d, st)
     return bool(st.get("locked", False))
+
+# [ADD] Bản async cho code trong event loop: file-mode (SQLite) chạy trong thread pool,
+# ghi được tuần tự hoá bằng asyncio.Lock (read-modify-write của on_trade_close không xen nhau).
+_rs_alock: Optional[asyncio.Lock] = None
+
+async def _rs_is_locked_today_async(storage, now: Optional[datetime] = None) -> bool:
+    # [MOD] ngày đã có trong cache → đọc thẳng trên loop, khỏi nhảy sang thread pool mỗi tick
+    if storage or not AUTO_LOCK_ON_2_SL or _rs_today_str(now) in _rs_day_cache:
+        return _rs_is_locked_today(storage, now)
+    return await asyncio.to_thread(_rs_is_locked_today, None, now)
+
+async def _rs_on_trade_close_async(storage, *, result: str, window_key: Optional[str], when: Optional[datetime] = None) -> bool:
+    global _rs_alock
+    if storage or not AUTO_LOCK_ON_2_SL:
+        return _rs_on_trade_close(storage, result=result, window_key=window_key, when=when)
+    if _rs_alock is None:
+        _rs_alock = asyncio.Lock()
+    async with _rs_alock:
+        return await asyncio.to_thread(
+            _rs_on_trade_close, None, result=result, window_key=window_key, when=when
+        )
 # ========= /RISK-SENTINEL =========
 
 # ========= Tide helpers =========
+# [ADD] Cache mốc thủy triều đã parse theo ngày: date_iso → list phút-trong-ngày (đã sort)
+_tide_cache: Dict[str, List[int]] = {}
+
+def _tide_minutes_for(date_iso: str) -> List[int]:
+    hit = _tide_cache.get(date_iso)
+    if hit is not None:
+        return hit
+    lines = get_tide_events(date_iso) or []
+    mins: List[int] = []
+    for s in lines:
+        parts = str(s).split()
+        if len(parts) < 2 or ":" not in parts[1]:
+            continue
+        hh, mm = parts[1].split(":")
+        mins.append(int(hh) * 60 + int(mm))
+    mins.sort()
+    if mins:
+        # ngày rỗng (lỗi fetch) không cache để tick sau thử lại; giữ tối đa vài ngày gần nhất
+        _tide_cache[date_iso] = mins
+        while len(_tide_cache) > 3:
+            _tide_cache.pop(min(_tide_cache), None)
+    return mins
+
+async def _tide_prefetch_loop() -> None:
+    """
+    Nạp sẵn mốc thủy triều hôm nay + ngày mai lúc khởi động và sau mỗi nửa đêm (giờ VN),
+    để tick đầu ngày không phải chờ đọc/parse. Lỗi → bỏ qua, _nearest_tide_center tự nạp lười.
+    """
+    while True:
+        now = now_vn()
+        today = now.date()
+        for d in (today, today + timedelta(days=1)):
+            try:
+                if callable(get_tide_events) and d.isoformat() not in _tide_cache:
+                    await asyncio.to_thread(_tide_minutes_for, d.isoformat())
+            except Exception:
+                _note_err("tide_prefetch")
+        # ngủ tới 00:00:05 hôm sau
+        nxt = now.replace(hour=0, minute=0, second=5, microsecond=0) + timedelta(days=1)
+        await asyncio.sleep(max(60.0, (nxt - now).total_seconds()))
+
+# [ADD] memo kết quả theo giây: mọi uid trong cùng tick dùng chung 1 lần tính
+# [key, (center, center_ts)] — center_ts (epoch int) để tính tau bằng số nguyên, khỏi tạo timedelta
+_tide_center_memo: List[Any] = [None, (None, None)]
+_INV_3600 = 1.0 / 3600.0
+
 def _nearest_tide_center(now: datetime) -> Optional[datetime]:
     """
     Lấy mốc thủy triều gần nhất (High/Low) trong ngày để tính late-window & TP-by-time.
     """
+    return _nearest_tide_center_ts(now)[0]
+
+def _nearest_tide_center_ts(now: datetime) -> Tuple[Optional[datetime], Optional[int]]:
+    """Như _nearest_tide_center nhưng trả kèm epoch của mốc: (center, center_ts); không có → (None, None)."""
     try:
+        key = (int(now.timestamp()), now.utcoffset())
+        if _tide_center_memo[0] == key:
+            return _tide_center_memo[1]
         if not callable(get_tide_events):
-            return None
-        lines = get_tide_events(now.date().isoformat()) or []
-        cands: List[datetime] = []
-        for s in lines:
-            parts = str(s).split()
-            if len(parts) < 2 or ":" not in parts[1]:
-                continue
-            hh, mm = parts[1].split(":")
-            t = now.replace(hour=int(hh), minute=int(mm), second=0, microsecond=0)
-            cands.append(t)
-        if not cands:
-            return None
-        return min(cands, key=lambda t: abs((t - now).total_seconds()))
+            return None, None
+        mins = _tide_minutes_for(_fast_day(now))
+        if not mins:
+            return None, None
+        m_now = now.hour * 60 + now.minute + (now.second + now.microsecond / 1e6) / 60.0
+        # list đã sort → bisect O(log N); chỉ so 2 ứng viên kề bên (hoà → lấy mốc sớm hơn)
+        i = bisect.bisect_left(mins, m_now)
+        if i == 0:
+            m = mins[0]
+        elif i == len(mins):
+            m = mins[-1]
+        else:
+            lo, hi = mins[i - 1], mins[i]
+            m = lo if (m_now - lo) <= (hi - m_now) else hi
+        center = now.replace(hour=m // 60, minute=m % 60, second=0, microsecond=0)
+        res = (center, int(center.timestamp()))
+        _tide_center_memo[:] = [key, res]
+        return res
     except Exception:
-        return None
+        return None, None
 
 def _current_tp_hours() -> float:
     """
     Thời gian giữ lệnh tối đa trước khi TP-by-time (giờ).
     """
+    return _CFG.tp_time_hours
+
+# ========= State =========
+# [MOD] Vị thế mở: dataclass slots thay cho dict 9 key (truy cập attr, nhỏ hơn, không hash chuỗi)
+@dataclass(slots=True)
+class OpenPos:
+    pair: str
+    side: str
+    qty: Optional[str]
+    entry_time: datetime
+    tide_center: Optional[datetime]
+    tp_deadline: Optional[datetime]
+    simulation: bool
+    sl_price: Optional[float]
+    tide_window_key: Optional[str]
+    tp_base: Optional[datetime] = None   # mốc tính TP-by-time (tide_center hoặc entry_time, có tz)
+
+# [MOD] Gom state theo uid vào 1 object (1 lookup/uid/tick thay vì nhiều dict song song)
+@dataclass(slots=True)
+class UserCtx:
+    last_slot: int = -1                      # chống spam 1 tick trong cùng slot M5
+    last_decision_text: str = ""             # text cuối cùng để /autolog in ra
+    # [ADD] report block đi kèm — lưu riêng, chỉ ghép "\n\n" khi /autolog đọc (skip path không concat chuỗi dài)
+    last_decision_block: str = ""
+    last_entry: Dict[str, Any] = field(default_factory=dict)  # meta lần vào (cooldown/second-entry)
+    m30_consec: Optional[Dict[str, Any]] = None  # đếm N nến M30 liên tiếp
+    # Vị thế đang mở để xử lý TP-by-time
+    open_pos: Optional[OpenPos] = None
+    # [ADD] TP-by-time do timer riêng đánh thức (tp_due); probe "đóng sớm" chỉ chạy mỗi TP_PROBE_SEC
+    tp_due: bool = False
+    tp_probe_at: float = 0.0
+
+_CTX: Dict[int, UserCtx] = {}
+# uid đang có vị thế mở (scheduler lọc/backoff theo tập này)
+_open_uids: set = set()
+
+def _ctx(uid: int) -> UserCtx:
+    c = _CTX.get(uid)
+    if c is None:
+        c = _CTX[uid] = UserCtx()
+    return c
+
+def _open_pos_set(uid: int, pos: OpenPos) -> None:
+    if not pos.pair:
+        pos.pair = "BTC/USDT"
+    base = pos.tide_center or pos.entry_time or now_vn()
     try:
-        h = float(os.getenv("TP_TIME_HOURS", "12"))
-        return max(0.5, min(48.0, h))
+        if base.tzinfo is None:
+            base = base.replace(tzinfo=VN_TZ)
     except Exception:
-        return 12.0
+        base = now_vn()
+    pos.tp_base = base
+    _ctx(uid).open_pos = pos
+    _open_uids.add(uid)
+
+def _open_pos_drop(uid: int) -> None:
+    c = _CTX.get(uid)
+    if c is not None:
+        c.open_pos = None
+        c.tp_due = False
+    _open_uids.discard(uid)
+    t = _tp_tasks.pop(uid, None)
+    if t is not None and t is not asyncio.current_task():
+        t.cancel()
+
+# [ADD] Timer TP-by-time theo vị thế: ngủ 1 lần tới deadline thay vì poll mỗi tick.
+# Tới hạn → bật tp_due + đẩy 1 tick vào actor của uid (đóng lệnh vẫn chạy trong actor, 1 writer).
+# /setenv đổi TP_TIME_HOURS → _tp_wake.set() đánh thức mọi timer để tính lại deadline.
+_TP_PROBE_SEC = float(os.getenv("TP_PROBE_SEC", "60") or 60)
+_tp_tasks: Dict[int, asyncio.Task] = {}
+_tp_wake = asyncio.Event()
+
+async def _tp_timer(uid: int, app, storage) -> None:
+    while True:
+        c = _CTX.get(uid)
+        pos = c.open_pos if c is not None else None
+        if pos is None or pos.tp_base is None:
+            return
+        wait = (pos.tp_base + _CFG.tp_time_delta - now_vn()).total_seconds()
+        if wait <= 0:
+            break
+        try:
+            await asyncio.wait_for(_tp_wake.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+    c.tp_due = True
+    _dispatch_tick(uid, app, storage)
+
+def _tp_arm(uid: int, app, storage) -> None:
+    old = _tp_tasks.pop(uid, None)
+    if old is not None:
+        old.cancel()
+    _tp_tasks[uid] = asyncio.create_task(_tp_timer(uid, app, storage))
 
-# ========= State =========
-# Lưu text cuối cùng để /autolog in ra
-_last_decision_text: Dict[int, str] = {}
-# Chống spam 1 tick trong cùng slot M5
-_last_m5_slot_sent: Dict[int, int] = {}
-# [DEPRECATED] quota theo cửa sổ thủy triều — đã chuyển sang TideGate
-_user_tide_state: Dict[int, Dict[str, Any]] = {}
-# Vị thế đang mở (theo UID) để xử lý TP-by-time
-_open_pos: Dict[int, Dict[str, Any]] = {}
-# [OLD] Mốc thời gian vào lệnh gần nhất (global gap guard)
-_LAST_EXEC_TS: Dict[int, float] = {}  # key=uid, val=epoch seconds
 # [NEW] States cho patch A & B
-_m30_guard_state: Dict[int, Dict[str, Dict[str, Any]]] = {}
-_m30_consec_state: Dict[int, Dict[str, Any]] = {}
-_last_entry_meta: Dict[int, Dict[str, Any]] = {}
+# [MOD] phẳng hoá: key=(uid, "YYYY-mm-dd", "HH:MM") thay vì dict 3 tầng
+_m30_guard_state: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+_m30_guard_day: str = ""
+# [ADD] Cache evaluate_signal theo slot M5: key=(pair, tide_window_hours, balance) → (slot, res)
+_eval_cache: Dict[Tuple[str, float, float], Tuple[int, Any]] = {}
+_eval_futures: Dict[Tuple[Tuple[str, float, float], int], asyncio.Future] = {}  # (key, slot) → future
+
+def _sweep_day_state(key_day: str) -> None:
+    """Qua ngày mới → xoá state M30-guard của các ngày cũ (chạy 1 lần/ngày)."""
+    global _m30_guard_day
+    if key_day == _m30_guard_day:
+        return
+    _m30_guard_day = key_day
+    for k in [k for k in _m30_guard_state if k[1] != key_day]:
+        _m30_guard_state.pop(k, None)
+
+async def _evaluate_signal_cached(pair_disp: str, symbol: str, tide_window_hours: float,
+                                  balance_usdt: float, slot: int) -> Any:
+    """
+    Cùng 1 slot M5 + cùng tham số → kết quả evaluate_signal như nhau cho mọi user.
+    Single-flight: miss đầu tiên chạy evaluate_signal (sync) trong thread pool, các user khác
+    cùng key + cùng slot await chung 1 future. Lỗi không cache (để tick sau thử lại).
+    Kết quả trả về là 1 object dùng chung giữa các user → chỉ đọc, không sửa tại chỗ.
+    """
+    key = (pair_disp, round(tide_window_hours, 2), round(balance_usdt, 2))
+    hit = _eval_cache.get(key)
+    if hit and hit[0] == slot:
+        return hit[1]
+    # future gắn theo slot: user ở slot mới không nhận nhầm kết quả của lượt slot cũ còn đang chạy
+    fkey = (key, slot)
+    fut = _eval_futures.get(fkey)
+    if fut is not None:
+        return await asyncio.shield(fut)
+
+    def _run():
+        try:
+            return evaluate_signal(pair_disp, tide_window_hours=tide_window_hours, balance_usdt=balance_usdt)
+        except TypeError:
+            return evaluate_signal(symbol)  # type: ignore
+
+    loop = asyncio.get_running_loop()
+    fut = _eval_futures[fkey] = loop.run_in_executor(None, _run)
+    try:
+        res = await asyncio.shield(fut)
+        # lượt slot cũ về muộn không được ghi đè entry của slot mới hơn
+        if slot >= _eval_cache.get(key, (-1,))[0]:
+            _eval_cache[key] = (slot, res)
+        # dọn entry cũ (slot < hiện tại - 2) để giới hạn bộ nhớ
+        for k in [k for k, (s, _) in _eval_cache.items() if s < slot - 2]:
+            _eval_cache.pop(k, None)
+        return res
+    finally:
+        _eval_futures.pop(fkey, None)
 
 def get_last_decision_text(uid: int) -> Optional[str]:
-    return _last_decision_text.get(uid)
+    c = _CTX.get(uid)
+    if c is None or not c.last_decision_text:
+        return None
+    if c.last_decision_block:
+        return c.last_decision_text + "\n\n" + c.last_decision_block
+    return c.last_decision_text
 
 # Cho phép /setenv hoặc /preset ghi đè runtime (nếu có API)
 def set_runtime_env(kv: Dict[str, str]) -> None:
     _apply_runtime_env(kv)
 
 # ========= Quyết định & vào lệnh =========
-@dataclass
-class UserState:
-    settings: Any
-
 # ==============Hàm (A) Gate/Decision ==================
-async def _auto_gate_decision(uid: int, app, storage) -> Optional[dict]:
+# [ADD] Lý do TideGate được phép chặn TRƯỚC evaluate_signal: không ảnh hưởng state M30 flip-guard
+# (OUT_OF_LATE_BAND không nằm đây — tick trước tâm/trước late-band vẫn phải ghi pre_side).
+_TG_EARLY_BLOCK = frozenset({"OUT_OF_TIDE_WINDOW", "NO_TIDE_DATA", "DAY_LIMIT", "WINDOW_LIMIT"})
+
+async def _auto_gate_decision(uid: int, app, storage, st=None) -> Optional[dict]:
     """
     (A) Gate/Decision:
     - Toàn bộ các bước gốc của decide_once_for_uid cho AUTO.
     - Nếu skip → return {"ok": False, "reason": msg, "text_block": ...}
     - Nếu pass → return dict chứa mọi dữ liệu cần cho bước B (Hub) và C (Broadcast).
     """
-    now = now_vn()
+    # [ADD] Cổng M5 bằng time.time() + số nguyên TRƯỚC khi dựng datetime tz:
+    # đa số tick rơi ngoài cửa sổ đóng nến → return sớm. Bật VERBOSE thì đi đường cũ để còn log SKIP.
+    # Lưu ý nhịp thông báo: cổng này đứng TRƯỚC kiểm tra auto_off / risk-lock, nên khi VERBOSE tắt
+    # tin "Auto LOCKED hôm nay" chỉ gửi ở các tick trong cửa sổ đóng nến M5 (0..M5_MAX_DELAY_SEC),
+    # không còn mỗi tick. Tin SKIP auto_off vốn chỉ gửi khi VERBOSE → không đổi.
+    tf = time.time()
+    ts = int(tf)
+    slot = _floor_5m_epoch(ts)
+    delay = ts - slot * 300
+    if not (AUTO_DEBUG and AUTO_DEBUG_VERBOSE):
+        if not (0 <= delay <= M5_MAX_DELAY_SEC):
+            return {"ok": False, "reason": f"not_m5_close delay={delay}"}
+        if uid in _CTX and _CTX[uid].last_slot == slot:
+            return {"ok": False, "reason": "dup_slot"}
+
+    ctx = _ctx(uid)
+    # datetime tz chỉ dựng khi đã qua cổng, từ CÙNG lần đọc đồng hồ với slot (không lệch giây)
+    try:
+        now = datetime.fromtimestamp(tf, VN_TZ)
+    except Exception:
+        now = now_vn()
+    # [ADD] format thời gian 1 lần/tick; các key ngày/giờ cắt lát từ chuỗi này
+    t_iso = _fast_ts(now)
+    key_day = t_iso[:10]
 
-    # 1) Lấy user settings
+    # 1) Lấy user settings (st prefetch từ scheduler nếu có)
+    # [MOD] xét mode/auto_on TRƯỚC → user tắt auto return ngay, không parse pair/risk/leverage/balance
     try:
-        st = storage.get_user(uid)
-        pair_disp = st.settings.pair or "BTC/USDT"
+        if st is None:
+            st = storage.get_user(uid)
+        s = st.settings
+        mode = str(getattr(s, "mode", "manual")).lower()
+        auto_on = (mode == "auto") or bool(getattr(s, "auto_trade_enabled", False))
+    except Exception:
+        s = None
+        mode = "auto"
+        auto_on = True
+
+    if not auto_on:
+        if AUTO_DEBUG and AUTO_DEBUG_VERBOSE:
+            _debug_send_bg(app, uid, _one_line("SKIP", "auto_off", t_iso))
+        return {"ok": False, "reason": "auto_off"}
+
+    try:
+        pair_disp = s.pair or "BTC/USDT"
         symbol = pair_disp.replace("/", "")
-        risk_percent = float(getattr(st.settings, "risk_percent", 10.0))
-        leverage = int(float(getattr(st.settings, "leverage", 10)))
-        mode = str(getattr(st.settings, "mode", "manual")).lower()
-        auto_on = (mode == "auto") or bool(getattr(st.settings, "auto_trade_enabled", False))
-        balance_usdt = float(getattr(st.settings, "balance_usdt", 100.0))
-        tide_window_hours = float(getattr(st.settings, "tide_window_hours", TIDE_WINDOW_HOURS))
+        risk_percent = float(getattr(s, "risk_percent", 10.0))
+        leverage = int(float(getattr(s, "leverage", 10)))
+        balance_usdt = float(getattr(s, "balance_usdt", 100.0))
+        tide_window_hours = float(getattr(s, "tide_window_hours", TIDE_WINDOW_HOURS))
     except Exception:
         # Fallback an toàn
         pair_disp = "BTC/USDT"
         symbol = "BTCUSDT"
         risk_percent = 10.0
         leverage = 10
-        mode = "auto"
-        auto_on = True
         balance_usdt = 100.0
         tide_window_hours = TIDE_WINDOW_HOURS
 
-    if not auto_on:
-        if AUTO_DEBUG and AUTO_DEBUG_VERBOSE:
-            await _debug_send(app, uid, _one_line("SKIP", "auto_off", now))
-        return {"ok": False, "reason": "auto_off"}
-
     # === RISK-SENTINEL: chặn auto nếu hôm nay đã bị LOCK ===
-    if _rs_is_locked_today(storage, now):
+    if await _rs_is_locked_today_async(storage, now):
         if AUTO_LOCK_NOTIFY:
-            try:
-                chat_id = int(AUTO_DEBUG_CHAT_ID) if AUTO_DEBUG_CHAT_ID.isdigit() else uid
-                await app.bot.send_message(chat_id=chat_id, text=f"⚠️ Auto LOCKED hôm nay ({_rs_status_today(storage)['day']}). Yêu cầu kiểm tra thủ công.")
-            except Exception:
-                pass
+            chat_id = _AUTO_DEBUG_CHAT_ID_INT if _AUTO_DEBUG_CHAT_ID_INT is not None else uid
+            _send_bg(app, chat_id, f"⚠️ Auto LOCKED hôm nay ({_rs_today_str(now)}). Yêu cầu kiểm tra thủ công.")
         return {"ok": False, "reason": "locked_today"}
 
-    # 2) Chỉ xử lý ngay sau khi đóng nến M5
-    ts = int(now.timestamp())
-    slot = _floor_5m_epoch(ts)
-    boundary = slot * 300
-    delay = ts - boundary
+    # 2) Chỉ xử lý ngay sau khi đóng nến M5 (ts/slot/delay đã tính ở đầu hàm)
     if not (0 <= delay <= M5_MAX_DELAY_SEC):
         if AUTO_DEBUG and AUTO_DEBUG_VERBOSE:
-            await _debug_send(app, uid, _one_line("SKIP", "not_m5_close", now, f"delay={delay}s"))
+            _debug_send_bg(app, uid, _one_line("SKIP", "not_m5_close", t_iso, f"delay={delay}s"))
         return {"ok": False, "reason": f"not_m5_close delay={delay}"}
-    if _last_m5_slot_sent.get(uid) == slot:
+    if ctx.last_slot == slot:
         return {"ok": False, "reason": "dup_slot"}
-    _last_m5_slot_sent[uid] = slot
+    ctx.last_slot = slot
+
+    # 2b) [ADD] AUTO: TideGate (T) chỉ phụ thuộc thời điểm + counters, không cần kết quả A
+    # → kiểm tra trước evaluate_signal; ngoài khung / thiếu data / hết quota thì bỏ qua phần tính nặng.
+    # [MOD] OUT_OF_LATE_BAND KHÔNG return sớm: các tick trước tâm / trước late-band vẫn phải chạy
+    # M30 flip-guard để ghi pre_side và mốc post_stable_since. Kết quả T được chuyển qua gate
+    # để decide_once_for_uid dùng lại, không gọi tide_gate_check lần 2.
+    tgr_pre = cfg_t = None
+    if mode == "auto":
+        try:
+            cfg_t = await _load_tidegate_config(storage, uid, st)
+            tgr_pre = await tide_gate_check(
+                now=now.astimezone(timezone.utc),
+                storage=storage,
+                cfg=cfg_t,
+                scope_uid=(uid if cfg_t.counter_scope == "per_user" else None),
+            )
+        except Exception:
+            tgr_pre = None  # lỗi → để T sau A quyết như cũ
+        if tgr_pre is not None and not tgr_pre.ok and tgr_pre.reason in _TG_EARLY_BLOCK:
+            # chặn sớm xảy ra ở mọi slot M5 ngoài khung → chỉ log khi VERBOSE (tránh ~288 tin/ngày/uid)
+            if AUTO_DEBUG and AUTO_DEBUG_VERBOSE:
+                _debug_send_bg(app, uid, f"[TideGate BLOCKED] {tgr_pre.reason} {tgr_pre.counters}")
+            return {"ok": False, "reason": f"TIDE_BLOCKED:{tgr_pre.reason}"}
 
     # 3) Evaluate report CHUẨN
     try:
-        res = evaluate_signal(pair_disp, tide_window_hours=tide_window_hours, balance_usdt=balance_usdt)
-    except TypeError:
-        res = evaluate_signal(symbol)  # type: ignore
+        res = await _evaluate_signal_cached(pair_disp, symbol, tide_window_hours, balance_usdt, slot)
     except Exception as e:
-        await _debug_send(app, uid, _one_line("ERR", "evaluate_signal_error", now, str(e)))
+        _debug_send_bg(app, uid, _one_line("ERR", "evaluate_signal_error", t_iso, str(e)))
         return {"ok": False, "reason": f"evaluate_signal_error {e}"}
 
     if not isinstance(res, dict) or not res.get("ok", False):
         reason = (isinstance(res, dict) and (res.get("text") or res.get("reason"))) or "evaluate_signal() failed"
-        await _debug_send(app, uid, _one_line("SKIP", "bad_report", now, reason))
+        _debug_send_bg(app, uid, _one_line("SKIP", "bad_report", t_iso, reason))
         return {"ok": False, "reason": "bad_report"}
 
     # 4) Rút trích thông tin CHUẨN theo /report
@@ -632,10 +1442,12 @@ async def _auto_gate_decision(uid: int, app, storage) -> Optional[dict]:
     m5f          = frames.get("M5", {}) or {}
 
     # 5) Late-window theo mốc thủy triều gần nhất (⚠️ chỉ để hiển thị; chặn sẽ do TideGate T)
-    center = _nearest_tide_center(now)
+    center, center_ts = _nearest_tide_center_ts(now)
+    key_win = _fast_hhmm(center) if isinstance(center, datetime) else "NA"
     tau = None
     if isinstance(center, datetime):
-        tau = (now - center).total_seconds() / 3600.0
+        # [MOD] center_ts trả kèm center → tau theo giây nguyên, không qua timedelta
+        tau = (tf - center_ts) * _INV_3600
     in_late = (tau is not None) and (ENTRY_LATE_FROM_HRS <= tau <= ENTRY_LATE_TO_HRS)
 
     # ⚠️ BỎ CHẶN ENTRY_LATE_ONLY Ở A — đã chuyển sang TideGate.
@@ -645,19 +1457,18 @@ async def _auto_gate_decision(uid: int, app, storage) -> Optional[dict]:
     # === M30 flip-guard & ổn định + consecutive-N ===
     side_m30 = str(m30.get("side", "NONE")).upper()
     if M30_FLIP_GUARD and side_m30 in ("LONG", "SHORT") and isinstance(center, datetime) and (tau is not None):
-        stable_sec = int(float(os.getenv("M30_STABLE_MIN_SEC", str(M30_STABLE_MIN_SEC))))
-        need_n = max(1, int(float(os.getenv("M30_NEED_CONSEC_N", str(M30_NEED_CONSEC_N)))))
-        g_user = _m30_guard_state.setdefault(uid, {})
-        g_day  = g_user.setdefault(now.strftime("%Y-%m-%d"), {})
-        g      = g_day.setdefault(center.strftime("%H:%M"), {})
+        stable_sec = _CFG.m30_stable_min_sec
+        need_n = _CFG.m30_need_consec_n
+        _sweep_day_state(key_day)
+        g = _m30_guard_state.setdefault((uid, key_day, key_win), {})
         # Trước tâm: ghi nhận và yêu cầu đợi qua tâm
         if tau < 0:
             if "pre_side" not in g:
                 g["pre_side"] = side_m30
-            msg = _one_line("SKIP", "m30_wait_post_center", now, f"tau={tau:.2f}h pre_side={g['pre_side']}")
-            _last_decision_text[uid] = msg + ("\n\n" + text_block if text_block else "")
+            msg = _one_line("SKIP", "m30_wait_post_center", t_iso, f"tau={tau:.2f}h pre_side={g['pre_side']}")
+            ctx.last_decision_text, ctx.last_decision_block = msg, text_block
             if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-                await _debug_send(app, uid, msg)
+                _debug_send_bg(app, uid, msg)
             return {"ok": False, "reason": msg, "text_block": text_block}
         # Sau tâm: yêu cầu ổn định đủ giây
         if "pre_side" not in g:
@@ -668,15 +1479,17 @@ async def _auto_gate_decision(uid: int, app, storage) -> Optional[dict]:
             g["post_stable_since"] = now
         waited = (now - g["post_stable_since"]).total_seconds()
         if waited < max(0, stable_sec):
-            msg = _one_line("SKIP", "m30_need_stable_sec", now, f"{waited:.0f}/{stable_sec}s side={side_m30}")
-            _last_decision_text[uid] = msg + ("\n\n" + text_block if text_block else "")
+            msg = _one_line("SKIP", "m30_need_stable_sec", t_iso, f"{waited:.0f}/{stable_sec}s side={side_m30}")
+            ctx.last_decision_text, ctx.last_decision_block = msg, text_block
             if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-                await _debug_send(app, uid, msg)
+                _debug_send_bg(app, uid, msg)
             return {"ok": False, "reason": msg, "text_block": text_block}
         # Cần N nến M30 liên tiếp
         if need_n > 1:
-            stc = _m30_consec_state.setdefault(uid, {"side": None, "count": 0, "last_bar_key": None})
-            bar_key = now.strftime("%Y-%m-%d %H") + f":{(now.minute // 30) * 30:02d}"
+            stc = ctx.m30_consec
+            if stc is None:
+                stc = ctx.m30_consec = {"side": None, "count": 0, "last_bar_key": None}
+            bar_key = t_iso[:13] + f":{(now.minute // 30) * 30:02d}"
             if stc["side"] != side_m30:
                 stc["side"] = side_m30
                 stc["count"] = 1
@@ -686,54 +1499,46 @@ async def _auto_gate_decision(uid: int, app, storage) -> Optional[dict]:
                     stc["count"] += 1
                     stc["last_bar_key"] = bar_key
             if stc["count"] < need_n:
-                msg = _one_line("SKIP", "m30_need_consec_n", now, f"side={side_m30} {stc['count']}/{need_n}")
-                _last_decision_text[uid] = msg + ("\n\n" + text_block if text_block else "")
+                msg = _one_line("SKIP", "m30_need_consec_n", t_iso, f"side={side_m30} {stc['count']}/{need_n}")
+                ctx.last_decision_text, ctx.last_decision_block = msg, text_block
                 if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-                    await _debug_send(app, uid, msg)
+                    _debug_send_bg(app, uid, msg)
                 return {"ok": False, "reason": msg, "text_block": text_block}
 
     # ⚠️ BỎ QUOTA MỖI CỬA SỔ Ở A — đã chuyển sang TideGate.
-    # key_day = now.strftime("%Y-%m-%d")
-    # key_win = f"{center.strftime('%H:%M') if center else 'NA'}"
-    # st_user = _user_tide_state.setdefault(uid, {})
-    # st_day  = st_user.setdefault(key_day, {})
-    # st_key  = st_day.setdefault(key_win, {"trade_count": 0})
-    # if int(st_key.get("trade_count", 0)) >= MAX_TRADES_PER_WINDOW:
-    #     ...
 
-    key_day = now.strftime("%Y-%m-%d")
-    key_win = f"{center.strftime('%H:%M') if center else 'NA'}"
     st_key  = {"trade_count": 0}  # giữ cấu trúc để không phá C; đếm thực sẽ do TideGate (sau B)
 
     # 6) Skip theo /report
     if skip_report:
-        msg = _one_line("SKIP", "report_skip", now, text_block.splitlines()[0] if text_block else "")
-        _last_decision_text[uid] = msg + "\n\n" + text_block
+        i_nl = text_block.find("\n")
+        msg = _one_line("SKIP", "report_skip", t_iso, text_block if i_nl < 0 else text_block[:i_nl])
+        ctx.last_decision_text, ctx.last_decision_block = msg, text_block
         if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-            await _debug_send(app, uid, msg)
+            _debug_send_bg(app, uid, msg)
         return {"ok": False, "reason": msg, "text_block": text_block}
 
     # 7) Không có tín hiệu
     if desired_side not in ("LONG", "SHORT"):
-        msg = _one_line("SKIP", "no_signal", now, f"conf={confidence}")
-        _last_decision_text[uid] = msg + "\n\n" + text_block
+        msg = _one_line("SKIP", "no_signal", t_iso, f"conf={confidence}")
+        ctx.last_decision_text, ctx.last_decision_block = msg, text_block
         if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-            await _debug_send(app, uid, msg)
+            _debug_send_bg(app, uid, msg)
         return {"ok": False, "reason": msg, "text_block": text_block}
 
     # 8) Bắt buộc M5 cùng hướng với M30 (nếu bật)
     if ENFORCE_M5_MATCH_M30:
         if side_m30 not in ("LONG", "SHORT"):
-            msg = _one_line("SKIP", "m30_side_none", now, "M30 không có hướng rõ ràng")
-            _last_decision_text[uid] = msg + "\n\n" + text_block
+            msg = _one_line("SKIP", "m30_side_none", t_iso, "M30 không có hướng rõ ràng")
+            ctx.last_decision_text, ctx.last_decision_block = msg, text_block
             if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-                await _debug_send(app, uid, msg)
+                _debug_send_bg(app, uid, msg)
             return {"ok": False, "reason": msg, "text_block": text_block}
         if desired_side != side_m30:
-            msg = _one_line("SKIP", "desired_vs_m30_mismatch", now, f"desired={desired_side} | m30={side_m30}")
-            _last_decision_text[uid] = msg + "\n\n" + text_block
+            msg = _one_line("SKIP", "desired_vs_m30_mismatch", t_iso, f"desired={desired_side} | m30={side_m30}")
+            ctx.last_decision_text, ctx.last_decision_block = msg, text_block
             if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-                await _debug_send(app, uid, msg)
+                _debug_send_bg(app, uid, msg)
             return {"ok": False, "reason": msg, "text_block": text_block}
 
     # 9) (Tùy) Gate M5 lần cuối
@@ -741,25 +1546,19 @@ async def _auto_gate_decision(uid: int, app, storage) -> Optional[dict]:
         gate_side = side_m30 if (ENFORCE_M5_MATCH_M30 and side_m30 in ("LONG", "SHORT")) else desired_side
         ok, reason, m5_meta = m5_entry_check(symbol, gate_side)
         if not ok:
-            msg = _one_line("SKIP", "m5_gate_fail", now, f"reason={reason}")
-            _last_decision_text[uid] = msg + "\n\n" + text_block
+            msg = _one_line("SKIP", "m5_gate_fail", t_iso, f"reason={reason}")
+            ctx.last_decision_text, ctx.last_decision_block = msg, text_block
             if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-                await _debug_send(app, uid, msg)
+                _debug_send_bg(app, uid, msg)
             return {"ok": False, "reason": msg, "text_block": text_block}
 
     # === M5 cooldown theo window + optional second-entry ===
-    try:
-        gap_min = int(float(os.getenv("M5_MIN_GAP_MIN", os.getenv("ENTRY_SEQ_WINDOW_MIN", "0"))))
-    except Exception:
-        gap_min = 0
-    scoped_to_window = (os.getenv("M5_GAP_SCOPED_TO_WINDOW", "true").strip().lower() in ("1","true","yes","on","y"))
-    allow_second = (os.getenv("ALLOW_SECOND_ENTRY", "true").strip().lower() in ("1","true","yes","on","y"))
-    try:
-        second_retrace_pct = float(os.getenv("M5_SECOND_ENTRY_MIN_RETRACE_PCT", "0.3"))
-    except Exception:
-        second_retrace_pct = 0.3
+    gap_min = _CFG.m5_min_gap_min
+    scoped_to_window = _CFG.m5_gap_scoped_to_window
+    allow_second = _CFG.allow_second_entry
+    second_retrace_pct = _CFG.second_entry_min_retrace_pct
 
-    last = _last_entry_meta.get(uid, {})
+    last = ctx.last_entry
     last_at = last.get("at")
     last_win = last.get("window")
     same_win = (last_win == key_win)
@@ -770,19 +1569,19 @@ async def _auto_gate_decision(uid: int, app, storage) -> Optional[dict]:
         gap_now = (now - last_at).total_seconds() / 60.0
         if gap_now < gap_min:
             need_m = int(gap_min - gap_now + 0.999)
-            note = _one_line("SKIP", "m5_gap_guard", now, f"need≥{gap_min}m, còn≈{need_m}m")
-            _last_decision_text[uid] = note + ("\n\n" + text_block if text_block else "")
+            note = _one_line("SKIP", "m5_gap_guard", t_iso, f"need≥{gap_min}m, còn≈{need_m}m")
+            ctx.last_decision_text, ctx.last_decision_block = note, text_block
             if AUTO_DEBUG and not AUTO_DEBUG_ONLY_WHEN_SKIP:
-                await _debug_send(app, uid, note)
+                _debug_send_bg(app, uid, note)
             return {"ok": False, "reason": note, "text_block": text_block}
 
     # Second-entry trong cùng window (nếu đã có >=1 lệnh) — CHỈ phục vụ logic phụ (TideGate sẽ đếm quota chính)
     if under_scope and same_win and int(last.get("order_seq", 0)) >= 1:
         if not allow_second:
-            msg = _one_line("SKIP", "second_entry_disabled", now, f"win={key_win}")
-            _last_decision_text[uid] = msg + "\n\n" + text_block
+            msg = _one_line("SKIP", "second_entry_disabled", t_iso, f"win={key_win}")
+            ctx.last_decision_text, ctx.last_decision_block = msg, text_block
             if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-                await _debug_send(app, uid, msg)
+                _debug_send_bg(app, uid, msg)
             return {"ok": False, "reason": msg, "text_block": text_block}
         try:
             px_now = float(m5f.get("close") or 0.0) if isinstance(m5f, dict) else 0.0
@@ -790,15 +1589,14 @@ async def _auto_gate_decision(uid: int, app, storage) -> Optional[dict]:
             last_side = str(last.get("side") or desired_side).upper()
             retrace_ok = False
             if last_px > 0 and px_now > 0:
-                if last_side == "LONG":
-                    retrace_ok = ((last_px - px_now) / last_px * 100.0) >= second_retrace_pct
-                else:
-                    retrace_ok = ((px_now - last_px) / last_px * 100.0) >= second_retrace_pct
+                # LONG cần giá giảm, SHORT cần giá tăng → gộp bằng hệ số dấu, 1 phép so sánh
+                sign = 1.0 if last_side == "LONG" else -1.0
+                retrace_ok = sign * (last_px - px_now) * (100.0 / last_px) >= second_retrace_pct
             if not retrace_ok:
-                msg = _one_line("SKIP", "second_entry_need_retrace", now, f"need≥{second_retrace_pct}%, last={last_px}, now={px_now}")
-                _last_decision_text[uid] = msg + "\n\n" + text_block
+                msg = _one_line("SKIP", "second_entry_need_retrace", t_iso, f"need≥{second_retrace_pct}%, last={last_px}, now={px_now}")
+                ctx.last_decision_text, ctx.last_decision_block = msg, text_block
                 if not AUTO_DEBUG_ONLY_WHEN_SKIP:
-                    await _debug_send(app, uid, msg)
+                    _debug_send_bg(app, uid, msg)
                 return {"ok": False, "reason": msg, "text_block": text_block}
         except Exception:
             pass
@@ -807,6 +1605,8 @@ async def _auto_gate_decision(uid: int, app, storage) -> Optional[dict]:
     return {
         "ok": True,
         "now": now,
+        "tgr": tgr_pre,       # kết quả TideGate đã tính ở 2b (None = chưa có → T chạy lại)
+        "tg_cfg": cfg_t,
         "pair_disp": pair_disp,
         "symbol": symbol,
         "risk_percent": risk_percent,
@@ -843,9 +1643,6 @@ async def _auto_execute_hub(uid: int, app, storage, gate: dict):
     - Thực hiện khớp lệnh qua execute_order_flow.
     - Trả về tất cả dữ liệu cần cho bước (C).
     """
-    import os, json
-    from datetime import datetime, timedelta
-
     now          = gate["now"]
     pair_disp    = gate["pair_disp"]
     desired_side = gate["desired_side"]
@@ -863,22 +1660,16 @@ async def _auto_execute_hub(uid: int, app, storage, gate: dict):
     exec_result = {}
 
     # TP-by-time ETA
-    try:
-        tp_hours = float(os.getenv("TP_TIME_HOURS", "5.5"))
-    except Exception:
-        tp_hours = 5.5
+    tp_hours = _CFG.tp_eta_hours
     center = center or now
     tp_eta = center + timedelta(hours=tp_hours)
 
     # Nhãn tide (khớp /report: ±TIDE_WINDOW_HOURS quanh anchor/center)
-    try:
-        tw_hrs = float(os.getenv("TIDE_WINDOW_HOURS", str(TIDE_WINDOW_HOURS)))
-    except Exception:
-        tw_hrs = TIDE_WINDOW_HOURS
+    tw_hrs = _CFG.tide_window_hours
     try:
         if center:
-            start_hhmm = (center - timedelta(hours=tw_hrs)).strftime("%H:%M")
-            end_hhmm   = (center + timedelta(hours=tw_hrs)).strftime("%H:%M")
+            start_hhmm = _fast_hhmm(center - timedelta(hours=tw_hrs))
+            end_hhmm   = _fast_hhmm(center + timedelta(hours=tw_hrs))
             tide_label = f"{start_hhmm}–{end_hhmm}"
         else:
             tide_label = None
@@ -895,7 +1686,7 @@ async def _auto_execute_hub(uid: int, app, storage, gate: dict):
     tp_price = None
     try:
         if ref_close and ref_close > 0.0:
-            sl_price, tp_price = auto_sl_by_leverage(ref_close, desired_side, leverage)
+            sl_price, tp_price = auto_sl_by_leverage(ref_close, desired_side, leverage, _CFG.tp_rr_mult)
     except Exception:
         sl_price, tp_price = (None, None)
 
@@ -913,21 +1704,13 @@ async def _auto_execute_hub(uid: int, app, storage, gate: dict):
     accounts_cfg = {"enabled": True, "prefer": "multi", "fallback_single": True}
     accounts_list = []
     try:
-        from config import settings as _S
-        if isinstance(getattr(_S, "ACCOUNTS", None), list):
-            accounts_list = list(_S.ACCOUNTS or [])
+        accounts_list = list(_S.get_accounts() or [])
     except Exception:
         accounts_list = []
 
-    # merge thêm từ ENV ACCOUNTS_JSON (nếu có)
-    j = os.getenv("ACCOUNTS_JSON")
-    if j:
-        try:
-            arr = json.loads(j)
-            if isinstance(arr, list):
-                accounts_list.extend([a for a in arr if isinstance(a, dict)])
-        except Exception:
-            pass
+    # merge thêm từ ENV ACCOUNTS_JSON (nếu có) — [MOD] đã parse sẵn trong _CFG
+    if _CFG.accounts_extra:
+        accounts_list.extend(_CFG.accounts_extra)
 
     # nếu có danh sách thì truyền thẳng (trade_executor.open_multi_account_orders sẽ dùng trường 'exchange', 'api_key', 'api_secret', ...)
     if accounts_list:
@@ -991,7 +1774,7 @@ async def _auto_execute_hub(uid: int, app, storage, gate: dict):
         if pa.get("single_error"):
             per_account_logs.append(f"• single_error: {pa['single_error']}")
     except Exception:
-        pass
+        _note_err("exec_logs")
 
     return {
         "opened_real": opened_real,
@@ -1048,12 +1831,8 @@ async def _auto_broadcast_and_log(uid: int, app, storage, result: dict):
     key_win = result.get("key_win")
 
     # [ADD] lấy mode_label từ exec_result.origin (ORDER/MANUAL/AUTO)
-    try:
-        mode_label = str((exec_result or {}).get("origin", "AUTO")).upper()
-        if not mode_label:
-            mode_label = "AUTO"
-    except Exception:
-        mode_label = "AUTO"
+    # [MOD] kiểm tra kiểu tường minh thay cho try/except
+    mode_label = (str(exec_result.get("origin") or "AUTO").upper() or "AUTO") if isinstance(exec_result, dict) else "AUTO"
 
     # [ADD] chọn "picked account" để hiển thị (ưu tiên MULTI opened trước, rồi mới đến SINGLE)
     picked = None
@@ -1103,8 +1882,9 @@ async def _auto_broadcast_and_log(uid: int, app, storage, result: dict):
 
         # === Broadcast: dùng _fmt_exec_broadcast giống /order_cmd ===
         try:
-            side_label = "LONG" if desired_side == "LONG" else "SHORT"
-            pair_clean = pair_disp.replace(":USDT", "")
+            # gate (A) chỉ cho qua LONG/SHORT → dùng thẳng desired_side
+            side_label = desired_side
+            pair_clean = _clean_pair(pair_disp)
 
             # Lấy thông tin từ exec_result (nếu hub trả về)
             single = (exec_result or {}).get("per_account", {}).get("single", {}) if isinstance(exec_result, dict) else {}
@@ -1125,51 +1905,45 @@ async def _auto_broadcast_and_log(uid: int, app, storage, result: dict):
                 if picked.get("tp") is not None:
                     tp_print = picked.get("tp")
 
-            # Entry(SPOT) để hiển thị đẹp
-            try:
-                entry_spot = _binance_spot_entry(pair_clean)  # nếu helper có sẵn
-            except Exception:
-                try:
-                    entry_spot = float(m30.get("close") or h4.get("close") or 0.0)
-                except Exception:
-                    entry_spot = None
-
-            btxt = _fmt_exec_broadcast(
-                pair=pair_clean,
-                side=side_label,
-                acc_name=account_name, ex_id=exchange_name,
-                lev=leverage, risk=risk_percent, qty=qty_print, entry_spot=entry_spot,
-                sl=sl_print, tp=tp_print,
-                tide_label=tide_label, mode_label=mode_label,  # [MOD] thay "AUTO" bằng mode_label
-                entry_ids=list((exec_result or {}).get("entry_ids") or []),
-                tp_time=tp_eta,  # in TP-by-time nếu đang áp dụng
-            )
-            await _broadcast_html(btxt)
+            # [MOD] lấy giá SPOT (REST đồng bộ) + format + đưa vào outbox chạy ở task nền
+            # → quyết định trả về ngay, không chờ mạng; thiếu cấu hình broadcast thì bỏ hẳn
+            if _TELEGRAM_BROADCAST_BOT_TOKEN and _TELEGRAM_BROADCAST_CHAT_ID:
+                t = asyncio.create_task(_emit_broadcast(
+                    pair=pair_clean,
+                    side=side_label,
+                    acc_name=account_name, ex_id=exchange_name,
+                    lev=leverage, risk=risk_percent, qty=qty_print,
+                    sl=sl_print, tp=tp_print,
+                    tide_label=tide_label, mode_label=mode_label,  # [MOD] thay "AUTO" bằng mode_label
+                    entry_ids=list((exec_result or {}).get("entry_ids") or []),
+                    tp_time=tp_eta,  # in TP-by-time nếu đang áp dụng
+                ))
+                _bg_tasks.add(t)
+                t.add_done_callback(_bg_tasks.discard)
         except Exception:
-            pass
+            _note_err("bcast_build")
 
     # 11) Lưu trạng thái vị thế để TP-by-time (dùng tp_eta ở trên)
-    try:
-        tide_window_key = center.strftime("%Y-%m-%dT%H:%M") if isinstance(center, datetime) else str(center)
-    except Exception:
-        tide_window_key = str(center)
-
-    _open_pos[uid] = {
-        "pair": pair_disp,
-        "side": desired_side,
-        "qty": None if not opened_real else "live",
-        "entry_time": now,
-        "tide_center": center,
-        "tp_deadline": tp_eta,
-        "simulation": (not opened_real),
-        "sl_price": sl_price,
-        "tide_window_key": tide_window_key,
-    }
+    # [MOD] ghép từ chuỗi ngày/giờ đã cache (center cố định suốt cửa sổ) thay vì strftime mỗi lệnh
+    tide_window_key = f"{_fast_day(center)}T{_fast_hhmm(center)}" if isinstance(center, datetime) else str(center)
+
+    _open_pos_set(uid, OpenPos(
+        pair=pair_disp,
+        side=desired_side,
+        qty=None if not opened_real else "live",
+        entry_time=now,
+        tide_center=center if isinstance(center, datetime) else None,
+        tp_deadline=tp_eta,
+        simulation=(not opened_real),
+        sl_price=sl_price,
+        tide_window_key=tide_window_key,
+    ))
+    _tp_arm(uid, app, storage)
 
     # (Đếm hiển thị cũ) — giữ state nhẹ để phục vụ cooldown/second-entry; quota thật do TideGate đếm
     order_seq = 0
     if opened_real:
-        order_seq = int(_last_entry_meta.get(uid, {}).get("order_seq", 0)) + 1
+        order_seq = int(_ctx(uid).last_entry.get("order_seq", 0)) + 1
 
     # === Đồng bộ storage để /status (today.count, tide_window_trades) ===
     if opened_real:
@@ -1191,85 +1965,92 @@ async def _auto_broadcast_and_log(uid: int, app, storage, result: dict):
                 pass
             storage.put_user(uid, st_persist)
         except Exception:
-            pass
+            _note_err("storage_sync")
 
     # Lưu meta lần vào để phục vụ cooldown/second-entry
     try:
         px_close = float(m5f.get("close") or 0.0) if isinstance(m5f, dict) else 0.0
-        _last_entry_meta[uid] = {
-            "at": now if opened_real else _last_entry_meta.get(uid, {}).get("at", None),
+        prev = _ctx(uid).last_entry
+        _ctx(uid).last_entry = {
+            "at": now if opened_real else prev.get("at", None),
             "window": key_win,  # chuỗi HH:MM cửa sổ thủy triều
-            "price": px_close if opened_real else _last_entry_meta.get(uid, {}).get("price", 0.0),
-            "side": desired_side if opened_real else _last_entry_meta.get(uid, {}).get("side", desired_side),
-            "order_seq": order_seq if opened_real else _last_entry_meta.get(uid, {}).get("order_seq", 0),
+            "price": px_close if opened_real else prev.get("price", 0.0),
+            "side": desired_side if opened_real else prev.get("side", desired_side),
+            "order_seq": order_seq if opened_real else prev.get("order_seq", 0),
         }
     except Exception:
-        pass
+        _note_err("last_entry")
 
     # 12) Build log /autolog
-    try:
-        side_m30 = str(m30.get("side", "NONE")).upper()
-    except Exception:
-        side_m30 = "NONE"
+    side_m30 = str(m30.get("side", "NONE")).upper() if isinstance(m30, dict) else "NONE"
 
     # [MOD] header dùng mode_label thay vì cố định AUTO
-    header = (
-        f"🤖 {mode_label} EXECUTE | {pair_disp} {desired_side}\n"
-        f"Score H4/M30: {h4.get('score',0)} / {m30.get('score',0)} | Total≈{confidence}\n"
-        f"rule M5==M30: {'ON' if ENFORCE_M5_MATCH_M30 else 'OFF'} | m30={side_m30}\n"
-        f"late_window={'YES' if in_late else 'NO'} | "
-        f"TP-by-time: {tp_eta.strftime('%Y-%m-%d %H:%M:%S')}\n"
-        f"➡️ EXECUTE {'OK' if opened_real else 'FAIL'} | {'counted' if opened_real else 'not-counted'}\n"
-        f"{chr(10).join(per_account_logs) if per_account_logs else ''}\n"
-        "━━━━━━━━━━━━━━━━━━━━━━━\n"
-    )
+    # [MOD] gom từng dòng vào list rồi join 1 lần (không join lồng trong f-string)
+    if opened_real:
+        exec_flag, count_flag = "OK", "counted"
+    else:
+        exec_flag, count_flag = "FAIL", "not-counted"
+    parts = [
+        f"🤖 {mode_label} EXECUTE | {pair_disp} {desired_side}",
+        f"Score H4/M30: {h4.get('score',0)} / {m30.get('score',0)} | Total≈{confidence}",
+        f"rule M5==M30: {'ON' if ENFORCE_M5_MATCH_M30 else 'OFF'} | m30={side_m30}",
+        f"late_window={'YES' if in_late else 'NO'} | TP-by-time: {_fast_ts(tp_eta)}",
+        f"➡️ EXECUTE {exec_flag} | {count_flag}",
+    ]
+    if per_account_logs:
+        parts.extend(per_account_logs)
+    else:
+        parts.append("")
+    parts.append("━━━━━━━━━━━━━━━━━━━━━━━\n")
+    header = "\n".join(parts)
     final_text = header + (text_block or "(no_report_block)")
-    _last_decision_text[uid] = final_text
+    ctx = _ctx(uid)
+    ctx.last_decision_text, ctx.last_decision_block = final_text, ""
 
     # Gửi log ra kênh debug
-    try:
-        chat_id = int(AUTO_DEBUG_CHAT_ID) if str(AUTO_DEBUG_CHAT_ID).isdigit() else uid
-    except Exception:
-        chat_id = uid
-    try:
-        await app.bot.send_message(chat_id=chat_id, text=final_text)
-    except Exception:
-        pass
+    chat_id = _AUTO_DEBUG_CHAT_ID_INT if _AUTO_DEBUG_CHAT_ID_INT is not None else uid
+    _send_bg(app, chat_id, final_text)
 
     return final_text
 
 #================= Mode Auto or Manual trong bot.mode_cmd ===========================
-async def decide_once_for_uid(uid: int, app, storage) -> Optional[str]:
+async def decide_once_for_uid(uid: int, app, storage, prefetched=None) -> Optional[str]:
     """
     - AUTO  : A -> T -> B -> (bump counters) -> C
     - MANUAL: A -> tạo/kiểm tra pending bằng approval_flow v2;
                nếu APPROVED thì (T -> B -> bump counters -> C);
                nếu REJECTED thì bỏ; nếu PENDING thì chờ.
     """
-    # 0) Lấy mode hiện tại
+    # 0) Lấy mode hiện tại (prefetched: UserState đã đọc bulk đầu tick)
+    st = prefetched
     try:
-        st = storage.get_user(uid)
+        if st is None:
+            st = storage.get_user(uid)
         mode = str(getattr(st.settings, "mode", "manual")).lower()
     except Exception:
         mode = "auto"
 
     # 1) A: Gate/Decision (luồng chung)
-    gate = await _auto_gate_decision(uid, app, storage)
+    gate = await _auto_gate_decision(uid, app, storage, st)
     if not gate or not gate.get("ok"):
         return None if not gate else gate.get("reason")
 
     # ====== TIDE GATE (T) — Áp dụng cho AUTO ngay sau A ======
     if mode == "auto":
-        cfg = await _load_tidegate_config(storage, uid)
-        tgr = await tide_gate_check(
-            now=now_vn().astimezone(timezone.utc),
-            storage=storage,
-            cfg=cfg,
-            scope_uid=(uid if cfg.counter_scope == "per_user" else None),
-        )
+        # [MOD] A đã chạy T ở bước 2b (cùng gate["now"]) → dùng lại; chỉ tính lại khi 2b lỗi/không chạy
+        tgr, cfg = gate.get("tgr"), gate.get("tg_cfg")
+        if tgr is None or cfg is None:
+            cfg = await _load_tidegate_config(storage, uid, st)
+            # cùng mốc thời gian với A (gate["now"]) → T không lệch giây so với quyết định
+            tgr = await tide_gate_check(
+                now=gate["now"].astimezone(timezone.utc),
+                storage=storage,
+                cfg=cfg,
+                scope_uid=(uid if cfg.counter_scope == "per_user" else None),
+            )
         if not tgr.ok:
             if AUTO_DEBUG:
-                await _debug_send(app, uid, f"[TideGate BLOCKED] {tgr.reason} {tgr.counters}")
+                _debug_send_bg(app, uid, f"[TideGate BLOCKED] {tgr.reason} {tgr.counters}")
             return f"TIDE_BLOCKED:{tgr.reason}"
 
         # B
@@ -1279,7 +2060,7 @@ async def decide_once_for_uid(uid: int, app, storage) -> Optional[str]:
             if result and result.get("opened_real"):
                 await bump_counters_after_execute(storage, tgr, uid if cfg.counter_scope == "per_user" else None)
         except Exception:
-            pass
+            _note_err("bump_counters")
         # C
         final_text = await _auto_broadcast_and_log(uid, app, storage, result)
         return final_text
@@ -1328,32 +2109,32 @@ async def decide_once_for_uid(uid: int, app, storage) -> Optional[str]:
 
     # nếu đã có pid → xem trạng thái
     if current_pid:
-        rec = get_pending(storage, current_pid)
+        rec = get_pending_raw(storage, current_pid)
         if not rec:
             # bị xoá ngoài ý muốn → clear pid để tạo mới
             storage.set(user_pid_key, None)
         else:
-            status = rec.status.upper()
-            if status == "PENDING":
+            status = Status.parse(rec["status"])
+            if status is Status.PENDING:
                 # vẫn đang chờ duyệt
                 return "MANUAL awaiting approval"
-            if status == "REJECTED":
+            if status is Status.REJECTED:
                 # user từ chối → đóng và clear pid
-                mark_done(storage, rec.pid, "REJECTED")
+                mark_done(storage, rec["pid"], Status.REJECTED)
                 storage.set(user_pid_key, None)
-                return f"MANUAL rejected id={rec.pid}"
-            if status == "APPROVED":
+                return f"MANUAL rejected id={rec['pid']}"
+            if status is Status.APPROVED:
                 # ĐÃ DUYỆT → trước khi chạy B phải re-check TideGate (T)
-                cfg = await _load_tidegate_config(storage, uid)
+                cfg = await _load_tidegate_config(storage, uid, st)
                 tgr = await tide_gate_check(
-                    now=now_vn().astimezone(timezone.utc),
+                    now=gate["now"].astimezone(timezone.utc),
                     storage=storage,
                     cfg=cfg,
                     scope_uid=(uid if cfg.counter_scope == "per_user" else None),
                 )
                 if not tgr.ok:
                     # không execute, clear pending
-                    mark_done(storage, rec.pid, "EXPIRED_TIDE")
+                    mark_done(storage, rec["pid"], Status.EXPIRED_TIDE)
                     storage.set(user_pid_key, None)
                     return f"TIDE_BLOCKED:{tgr.reason}"
                 # B
@@ -1362,10 +2143,10 @@ async def decide_once_for_uid(uid: int, app, storage) -> Optional[str]:
                     try:
                         await bump_counters_after_execute(storage, tgr, uid if cfg.counter_scope == "per_user" else None)
                     except Exception:
-                        pass
+                        _note_err("bump_counters")
                 # C
                 final_text = await _auto_broadcast_and_log(uid, app, storage, result)
-                mark_done(storage, rec.pid, "APPROVED")
+                mark_done(storage, rec["pid"], Status.APPROVED)
                 storage.set(user_pid_key, None)
                 return final_text
             # trạng thái lạ → clear cho an toàn
@@ -1373,54 +2154,54 @@ async def decide_once_for_uid(uid: int, app, storage) -> Optional[str]:
 
     # chưa có pending cho user → tạo mới
     payload = _build_pending_payload_from_gate(gate)
-    rec = create_pending_v2(storage, payload)   # -> ManualPendingRecord(pid=..., status="PENDING")
-    storage.set(user_pid_key, rec.pid)
+    rec = create_pending_v2(storage, payload)   # -> ManualPendingRecord {"pid": ..., "status": Status.PENDING}
+    storage.set(user_pid_key, rec["pid"])
 
     # gửi thông báo duyệt (để m5report hoặc PM hiển thị ID)
     try:
         pair = gate["pair_disp"]; side = gate["desired_side"]; conf = gate["confidence"]
         msg = (
             f"🟡 <b>MANUAL PENDING</b> | {pair} {side}\n"
-            f"• ID: <code>{rec.pid}</code>\n"
+            f"• ID: <code>{rec['pid']}</code>\n"
             f"• Confidence: {conf}\n"
-            f"• /approve {rec.pid} để vào lệnh  |  /reject {rec.pid} để bỏ qua"
+            f"• /approve {rec['pid']} để vào lệnh  |  /reject {rec['pid']} để bỏ qua"
         )
         notify_chat_id = getattr(st.settings, "manual_notify_chat_id", None) or uid
-        await app.bot.send_message(chat_id=notify_chat_id, text=msg, parse_mode="HTML", disable_web_page_preview=True)
+        _send_bg(app, notify_chat_id, msg, parse_mode="HTML", disable_web_page_preview=True)
     except Exception:
-        pass
+        _note_err("pending_notice")
 
-    return f"MANUAL PENDING created id={rec.pid}"
+    return f"MANUAL PENDING created id={rec['pid']}"
 
 
 
 # ========= TP-by-time theo mốc thủy triều =========
 async def maybe_tp_by_time(uid: int, app, storage) -> Optional[str]:
-    if uid not in _open_pos:
+    c = _CTX.get(uid)
+    if c is None or c.open_pos is None:
         return None
 
-    pos = _open_pos[uid]
+    pos = c.open_pos
+    pair = pos.pair
     now = now_vn()
-    dl = pos.get("tp_deadline")
 
     # === RISK-SENTINEL: nếu vị thế đã tự đóng trước hạn, kiểm tra xem đó có phải SL không ===
     # Điều kiện: trước hạn TP-by-time nhưng position đã flat (qty=0) -> suy đoán đóng do SL hoặc manual/TP.
     try:
-        if callable(ExchangeClient):
-            ex = ExchangeClient()
-            side_long, qty = await ex.current_position(pos.get("pair","BTC/USDT"))
+        if callable(_get_exchange):
+            ex = _get_exchange()
+            side_long, qty = await ex.current_position(pair)
             if (qty or 0.0) <= 1e-12:
                 # Vị thế đã hết. Lấy giá hiện tại để suy đoán.
                 last_price = None
                 try:
-                    ticker = await ex._io(ex.client.fetch_ticker, pos.get("pair","BTC/USDT"))
-                    last_price = float(ticker.get("last") or ticker.get("close") or 0.0)
+                    last_price = await _cached_last_price(ex, pair)
                 except Exception:
                     last_price = None
 
                 result = "MANUAL"
-                sl_p = pos.get("sl_price")
-                side = str(pos.get("side","")).upper()
+                sl_p = pos.sl_price
+                side = str(pos.side).upper()
                 if sl_p and last_price:
                     try:
                         if side == "LONG" and last_price <= float(sl_p) * 1.001:
@@ -1430,95 +2211,224 @@ async def maybe_tp_by_time(uid: int, app, storage) -> Optional[str]:
                     except Exception:
                         pass
 
-                locked = _rs_on_trade_close(
+                locked = await _rs_on_trade_close_async(
                     storage=storage,
                     result=result,
-                    window_key=pos.get("tide_window_key"),
+                    window_key=pos.tide_window_key,
                     when=now,
                 )
                 # dọn trạng thái
-                _open_pos.pop(uid, None)
+                _open_pos_drop(uid)
 
                 # thông báo nếu khoá
                 if locked and AUTO_LOCK_NOTIFY:
-                    try:
-                        chat_id = int(AUTO_DEBUG_CHAT_ID) if AUTO_DEBUG_CHAT_ID.isdigit() else uid
-                        await app.bot.send_message(chat_id=chat_id, text=f"⛔ ĐÃ KHÓA Auto: 2 SL liên tiếp qua 2 lần thủy triều. Auto tạm dừng đến hết ngày {_rs_status_today(storage)['day']}.")
-                    except Exception:
-                        pass
+                    chat_id = _AUTO_DEBUG_CHAT_ID_INT if _AUTO_DEBUG_CHAT_ID_INT is not None else uid
+                    _send_bg(app, chat_id, f"⛔ ĐÃ KHÓA Auto: 2 SL liên tiếp qua 2 lần thủy triều. Auto tạm dừng đến hết ngày {_rs_today_str(now)}.")
                 return f"AUTO CLOSE detected ({result})"
     except Exception:
-        pass
+        _note_err("tp_probe")
 
-    # cập nhật deadline runtime nếu ENV thay đổi
-    base = pos.get("tide_center") or pos.get("entry_time") or now
-    try:
-        if base.tzinfo is None:
-            base = base.replace(tzinfo=now.tzinfo)
-    except Exception:
-        pass
-    pos["tp_deadline"] = base + timedelta(hours=_current_tp_hours())
-    dl = pos["tp_deadline"]
+    # cập nhật deadline runtime nếu ENV thay đổi (base đã chuẩn tz lúc mở vị thế)
+    dl = pos.tp_deadline = pos.tp_base + _CFG.tp_time_delta
 
     if dl and now >= dl:
         order_msg = "(simulation)"
-        if callable(ExchangeClient) and not pos.get("simulation"):
+        if callable(_get_exchange) and not pos.simulation:
             try:
-                ex = ExchangeClient()
-                res = await ex.close_position(pos["pair"])
+                ex = _get_exchange()
+                res = await ex.close_position(pair)
                 order_msg = getattr(res, "message", str(res))
             except Exception as e:
                 order_msg = f"close_err:{e}"
 
+        window_key = pos.tide_window_key
         # dọn state vị thế
-        _open_pos.pop(uid, None)
-        msg = f"[TP-BY-TIME] {now.strftime('%Y-%m-%d %H:%M:%S')} | {pos.get('pair')} | {order_msg}"
-        try:
-            chat_id = int(AUTO_DEBUG_CHAT_ID) if AUTO_DEBUG_CHAT_ID.isdigit() else uid
-        except Exception:
-            chat_id = uid
-        try:
-            await app.bot.send_message(chat_id=chat_id, text=msg)
-        except Exception:
-            pass
+        _open_pos_drop(uid)
+        msg = f"[TP-BY-TIME] {_fast_ts(now)} | {pair} | {order_msg}"
+        chat_id = _AUTO_DEBUG_CHAT_ID_INT if _AUTO_DEBUG_CHAT_ID_INT is not None else uid
+        _send_bg(app, chat_id, msg)
 
         # Risk-sentinel: đánh dấu TP để reset streak
         try:
-            _ = _rs_on_trade_close(storage, result="TP", window_key=pos.get("tide_window_key"), when=now)
+            _ = await _rs_on_trade_close_async(storage, result="TP", window_key=window_key, when=now)
         except Exception:
-            pass
+            _note_err("rs_tp_close")
         return msg
 
     return None
 
 # ========= Vòng lặp nền =========
+# [ADD] Actor theo uid: mỗi uid 1 queue + 1 task xử lý tuần tự → state theo uid chỉ có 1 writer,
+# 2 tick của cùng uid không chồng nhau khi đang chờ I/O.
+_uid_queues: Dict[int, asyncio.Queue] = {}
+_uid_workers: Dict[int, asyncio.Task] = {}
+# [ADD] các actor chạy song song; semaphore giới hạn số uid đang chờ I/O sàn/Telegram cùng lúc
+_tick_sem = asyncio.Semaphore(max(1, int(float(os.getenv("AUTO_TICK_CONCURRENCY", "8") or 8))))
+
+# [ADD] cờ "tick có việc thật" (qua cổng M5 / có TP) → start_auto_loop dùng để backoff khi rảnh
+_tick_activity = False
+_IDLE_REASONS = ("not_m5_close", "dup_slot")
+
+async def _process_uid(uid: int, app, storage, st=None) -> None:
+    """1 tick của 1 uid: decide → TP-by-time (tuần tự trong uid); lỗi chỉ ảnh hưởng uid đó."""
+    global _tick_activity
+    try:
+        r = await decide_once_for_uid(uid, app, storage, prefetched=st)
+        if r is not None and not str(r).startswith(_IDLE_REASONS):
+            _tick_activity = True
+        # không có vị thế mở → khỏi gọi TP-by-time (tiết kiệm 1 frame/uid/tick)
+        # [MOD] deadline do _tp_timer báo (tp_due); ngoài ra chỉ probe "đóng sớm" mỗi TP_PROBE_SEC
+        if uid in _open_uids:
+            c = _CTX[uid]
+            t = time.monotonic()
+            if c.tp_due or t >= c.tp_probe_at:
+                c.tp_due = False
+                c.tp_probe_at = t + _TP_PROBE_SEC
+                if await maybe_tp_by_time(uid, app, storage) is not None:
+                    _tick_activity = True
+    except Exception as e:
+        # debug tắt (mặc định production) → không format gì cả, kể cả str(e)
+        if not AUTO_DEBUG:
+            return
+        _debug_send_bg(app, uid, f"[AUTO][ERR] {_ts_now_vn()} | exception | {e}")
+
+async def _uid_worker(uid: int, queue: asyncio.Queue) -> None:
+    while True:
+        app, storage, st, done = await queue.get()
+        try:
+            async with _tick_sem:
+                await _process_uid(uid, app, storage, st)
+        finally:
+            queue.task_done()
+            # [ADD] báo scheduler: uid này của tick đã xong (done = [số uid còn chờ, Event])
+            if done is not None:
+                done[0] -= 1
+                if done[0] <= 0:
+                    done[1].set()
+
+def _dispatch_tick(uid: int, app, storage, st=None, done: Optional[list] = None) -> bool:
+    """
+    Đẩy 1 tick cho uid; worker còn bận tick trước (queue đầy) → bỏ tick này (backpressure).
+    Trả True nếu đã xếp hàng (khi đó worker sẽ giảm bộ đếm `done` lúc xử lý xong).
+    """
+    q = _uid_queues.get(uid)
+    w = _uid_workers.get(uid)
+    if q is None or w is None or w.done():
+        q = _uid_queues[uid] = asyncio.Queue(maxsize=1)
+        _uid_workers[uid] = asyncio.create_task(_uid_worker(uid, q))
+    try:
+        q.put_nowait((app, storage, st, done))
+        return True
+    except asyncio.QueueFull:
+        return False
+
 async def start_auto_loop(app, storage):
     """
-    Worker nền: mỗi SCHEDULER_TICK_SEC, tick qua tất cả user đã từng tương tác
+    Worker nền: mỗi SCHEDULER_TICK_SEC, tick qua tất cả user đã từng tương tác.
+    Rảnh (không uid / không qua cổng M5) → giãn nhịp x2 tới AUTO_MAX_TICK_SEC.
     """
+    global _tick_activity
     uid_env = os.getenv("TELEGRAM_CHAT_ID", "").strip()
     forced_uid = int(uid_env) if uid_env.isdigit() else 0
 
+    # [ADD] nạp sẵn tide hôm nay/ngày mai (giữ ref trong _bg_tasks)
+    _tide_task = asyncio.create_task(_tide_prefetch_loop())
+    _bg_tasks.add(_tide_task)
+    _tide_task.add_done_callback(_bg_tasks.discard)
+
+    # [ADD] nhịp tick theo đồng hồ monotonic: next_tick = start + k*TICK → không trôi theo thời gian xử lý
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+
+    # [ADD] alias cục bộ cho các global dùng mỗi tick (LOAD_FAST thay vì LOAD_GLOBAL).
+    # Chỉ alias thứ không bị gán lại lúc chạy; cờ AUTO_DEBUG* vẫn đọc global vì /setenv đổi được.
+    _sleep, _mono, _wall = asyncio.sleep, loop.time, time.time
+    _dispatch, _open = _dispatch_tick, _open_uids
+    tick = SCHEDULER_TICK_SEC
+
+    # [ADD] cache danh sách uid: chỉ sort/int-cast lại khi dict data đổi (id/len khác)
+    _uids_sig = None
+    _uids_cached: List[int] = []
+    # [ADD] danh sách uid bật auto lọc sẵn: chỉ lọc lại khi list uid hoặc set auto_enabled_uids() đổi
+    # (giữ ref set cũ để so bằng `is`), mỗi tick chỉ cộng thêm uid còn vị thế mở
+    _act_src = None
+    _act_uids_sig = None
+    _act_cached: List[int] = []
+    _act_set: set = set()
+    idle_ticks = 0
+
     while True:
         # Lấy danh sách UID từ storage (hoặc ép một UID qua env để test)
         uids: List[int] = []
         try:
             data_dict = getattr(storage, "data", {}) or {}
-            uids = sorted([int(k) for k in data_dict.keys() if str(k).isdigit()])
+            sig = (id(data_dict), len(data_dict))
+            if sig != _uids_sig:
+                # key int dùng thẳng; key chuỗi (Storage JSON) mới isdigit + int — không str() mỗi key
+                _uids_cached = sorted([
+                    k if isinstance(k, int) else int(k)
+                    for k in data_dict
+                    if isinstance(k, int) or (isinstance(k, str) and k.isdigit())
+                ])
+                # forced_uid gộp luôn lúc rebuild → tick ổn định không phải quét list
+                if forced_uid and forced_uid not in set(_uids_cached):
+                    _uids_cached.append(forced_uid)
+                _uids_sig = sig
+            uids = _uids_cached
         except Exception:
-            uids = []
-        if forced_uid and forced_uid not in uids:
-            uids.append(forced_uid)
+            uids = [forced_uid] if forced_uid else []
 
-        # Tick từng user
+        # [ADD] chỉ tick uid bật auto (+ uid còn vị thế mở cho TP-by-time); VERBOSE giữ tick hết để còn log auto_off
+        if not (AUTO_DEBUG and AUTO_DEBUG_VERBOSE):
+            try:
+                active = storage.auto_enabled_uids()
+                if active is not _act_src or _uids_sig != _act_uids_sig:
+                    _act_cached = [u for u in uids if u in active or u == forced_uid]
+                    _act_set = set(_act_cached)
+                    _act_src, _act_uids_sig = active, _uids_sig
+                uids = _act_cached
+                if _open:
+                    uids = _act_cached + [u for u in _open if u not in _act_set]
+            except Exception:
+                _note_err("auto_uids")
+
+        # Đọc settings mọi user 1 lượt cho cả tick (storage không có bulk → từng worker tự đọc)
+        try:
+            states = storage.get_users_bulk(uids)
+        except Exception:
+            states = {}
+
+        # Tick từng user → actor của uid đó
+        # [MOD] đếm uid đã xếp hàng của CHÍNH tick này; chờ chúng xong (tối đa 1 nhịp) rồi mới xét
+        # backoff → _tick_activity phản ánh kết quả tick này, không phải việc còn sót của tick trước.
+        done = [0, asyncio.Event()]
         for uid in uids:
+            if _dispatch(uid, app, storage, states.get(uid), done):
+                done[0] += 1
+        in_flight = False
+        if done[0] > 0:
             try:
-                await decide_once_for_uid(uid, app, storage)
-                await maybe_tp_by_time(uid, app, storage)
-            except Exception as e:
-                if AUTO_DEBUG:
-                    await _debug_send(app, uid, f"[AUTO][ERR] {now_vn().strftime('%Y-%m-%d %H:%M:%S')} | exception | {e}")
-                continue
+                await asyncio.wait_for(done[1].wait(), timeout=tick)
+            except asyncio.TimeoutError:
+                in_flight = True  # còn quyết định đang chạy (chờ sàn/Telegram) → không tính là rảnh
 
-        await asyncio.sleep(SCHEDULER_TICK_SEC)
+        # backoff khi rảnh (TP-by-time có timer riêng, không cần giữ nhịp gốc khi có vị thế mở)
+        if uids and (_tick_activity or in_flight):
+            idle_ticks = 0
+        else:
+            idle_ticks += 1
+        _tick_activity = False
+        step = tick
+        if idle_ticks:
+            to_m5 = 300 - (_wall() % 300)
+            step = max(tick, min(tick * (2 ** min(idle_ticks, 5)), AUTO_MAX_TICK_SEC, to_m5))
+
+        next_tick += step
+        delay = next_tick - _mono()
+        if delay > 0:
+            await _sleep(delay)
+        else:
+            # quá tải → đặt lại mốc, không dồn tick bù
+            next_tick = _mono()
+            await _sleep(0)
 # ----------------------- /core/auto_trade_engine.py -----------------------
@@ -1,10 +1,15 @@
 # ----------------------- core/trade_executor.py -----------------------
 from __future__ import annotations
 import asyncio
+import hashlib
 import logging
 import math
 import os
 import json
+try:
+    import orjson  # [ADD] parse ACCOUNTS_JSON nhanh hơn; fallback stdlib json
+except ImportError:
+    orjson = None  # type: ignore
 from dataclasses import dataclass
 from typing import Optional, Tuple, List, Dict, Any, Literal
 from datetime import timedelta, datetime
@@ -1147,6 +1152,40 @@ class ExchangeClient:
             return OrderResult(False, f"close_percent failed: {e}")
 
 
+# ===================== Client pool =====================
+# [ADD] Giữ 1 ExchangeClient cho mỗi (exchange, api_key, sha256(api_secret), testnet) → tái dùng
+# ccxt client, markets đã load và HTTP session keep-alive thay vì dựng lại mỗi lệnh/mỗi lần đóng.
+# [MOD] key có hash secret: đổi secret (cùng key) phải dựng client mới; không giữ secret thô trong key.
+_ex_pool: Dict[Tuple[str, str, str, bool], ExchangeClient] = {}
+
+def _get_exchange(
+    exchange_id: Optional[str] = None,
+    api_key: Optional[str] = None,
+    api_secret: Optional[str] = None,
+    testnet: Optional[bool] = None,
+) -> ExchangeClient:
+    key = (
+        (exchange_id or EXCHANGE_ID).lower(),
+        api_key or API_KEY,
+        hashlib.sha256((api_secret or API_SECRET or "").encode()).hexdigest(),
+        TESTNET if testnet is None else bool(testnet),
+    )
+    cli = _ex_pool.get(key)
+    if cli is None:
+        cli = _ex_pool[key] = ExchangeClient(exchange_id, api_key, api_secret, testnet)
+    return cli
+
+def close_all() -> None:
+    """Đóng HTTP session của mọi client trong pool (gọi khi tắt bot)."""
+    for cli in list(_ex_pool.values()):
+        try:
+            sess = getattr(cli.client, "session", None)
+            if sess is not None:
+                sess.close()
+        except Exception:
+            pass
+    _ex_pool.clear()
+
 # ===================== Multi-account / close helpers =====================
 def _load_all_accounts() -> List[dict]:
     from config import settings as _S
@@ -1159,7 +1198,7 @@ def _load_all_accounts() -> List[dict]:
     except Exception:
         pass
     try:
-        accs = getattr(_S, "ACCOUNTS", [])
+        accs = _S.get_accounts()
         if isinstance(accs, list):
             lst.extend([a for a in accs if isinstance(a, dict)])
     except Exception:
@@ -1168,7 +1207,7 @@ def _load_all_accounts() -> List[dict]:
     try:
         j = os.getenv("ACCOUNTS_JSON", "")
         if j:
-            arr = json.loads(j)
+            arr = orjson.loads(j) if orjson else json.loads(j)
             if isinstance(arr, list):
                 lst.extend([a for a in arr if isinstance(a, dict)])
     except Exception:
@@ -1236,7 +1275,7 @@ async def close_position_on_account(account_name: str, pair: str, percent: float
         tnet = bool((acc or {}).get("testnet", tnet_d))
         disp_name = (acc or {}).get("name", account_name or "default")
 
-        cli = ExchangeClient(exid, api, sec, tnet)
+        cli = _get_exchange(exid, api, sec, tnet)
 
         cancel_on_100 = (os.getenv("CLOSE_CANCEL_ALL_ON_100", "true").strip().lower() in ("1", "true", "yes", "on"))
         cancel_partial_tp_sl = (os.getenv("CLOSE_CANCEL_TP_SL_ON_PARTIAL", "false").strip().lower() in ("1", "true", "yes", "on"))
@@ -1313,9 +1352,16 @@ async def close_position_on_all(pair: str, percent: float, *, side_filter: Optio
         seen.add(k)
         uniq.append(a)
 
-    for acc in uniq:
-        name = acc.get("name") or acc.get("exchange") or "default"
-        r = await close_position_on_account(name, acc.get("pair", pair or "BTC/USDT"), percent, side_filter=side_filter)
+    # [MOD] đóng song song các account (I/O-bound) → độ trễ = max RTT thay vì tổng RTT
+    names = [acc.get("name") or acc.get("exchange") or "default" for acc in uniq]
+    res_list = await asyncio.gather(
+        *(close_position_on_account(name, acc.get("pair", pair or "BTC/USDT"), percent, side_filter=side_filter)
+          for name, acc in zip(names, uniq)),
+        return_exceptions=True,
+    )
+    for name, r in zip(names, res_list):
+        if isinstance(r, BaseException):
+            r = {"ok": False, "message": f"{name}: err:{r}"}
         results.append(r)
 
     return results
@@ -1333,7 +1379,7 @@ except Exception:
         sec = getattr(_S, "API_SECRET", API_SECRET)
         tnet = getattr(_S, "TESTNET", TESTNET)
 
-        cli = ExchangeClient(exid, api, sec, tnet)
+        cli = _get_exchange(exid, api, sec, tnet)
 
         px = await cli.ticker_price(symbol)
         if px <= 0:
@@ -1374,12 +1420,13 @@ except Exception:
         from config import settings as _S
 
         try:
-            ACCOUNTS = getattr(_S, "ACCOUNTS", [])
+            ACCOUNTS = _S.get_accounts()
             if not isinstance(ACCOUNTS, list):
                 ACCOUNTS = []
         except Exception:
             try:
-                ACCOUNTS = json.loads(os.getenv("ACCOUNTS_JSON", "[]"))
+                _j = os.getenv("ACCOUNTS_JSON", "[]")
+                ACCOUNTS = orjson.loads(_j) if orjson else json.loads(_j)
                 if not isinstance(ACCOUNTS, list):
                     ACCOUNTS = []
             except Exception:
@@ -1397,7 +1444,7 @@ except Exception:
                 tnet = bool(acc.get("testnet", TESTNET))
                 pair = acc.get("pair", symbol)
 
-                cli = ExchangeClient(exid, api, sec, tnet)
+                cli = _get_exchange(exid, api, sec, tnet)
 
                 px = await cli.ticker_price(pair)
                 if px <= 0:
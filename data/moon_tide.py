@@ -1,6 +1,6 @@
 # ----------------------- data/moon_tide.py -----------------------
 from __future__ import annotations
-import json, math
+import json, math, os, threading
 from datetime import datetime, timedelta, timezone
 from typing import List, Tuple, Optional, Dict, Any
 import requests
@@ -71,20 +71,37 @@ PRESETS: Dict[str, Dict[str, Any]] = {
 }
 
 # ==== Cache helpers ==============================================
-def _load_cache() -> dict:
+# [ADD] get_tide_events/get_moon_phase có thể chạy song song (event loop + thread pool của auto engine)
+# → đọc/ghi cache dưới 1 lock; ghi qua file tạm + os.replace để reader không bao giờ thấy file dở.
+_cache_lock = threading.Lock()
+
+def _read_cache() -> dict:
     try:
         with open(CACHE_FILE, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception:
         return {}
 
+def _load_cache() -> dict:
+    with _cache_lock:
+        return _read_cache()
+
 def _save_cache(data: dict) -> None:
+    tmp = CACHE_FILE + ".tmp"
     try:
-        with open(CACHE_FILE, "w", encoding="utf-8") as f:
+        with open(tmp, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, CACHE_FILE)
     except Exception:
         pass
 
+def _cache_put(section: str, key: str, value) -> None:
+    """Ghi 1 mục: đọc lại bản mới nhất dưới lock rồi mới ghi (không đè mục thread khác vừa thêm)."""
+    with _cache_lock:
+        cache = _read_cache()
+        cache.setdefault(section, {})[key] = value
+        _save_cache(cache)
+
 # ==== External APIs ==============================================
 def get_moon_phase(date_str: str) -> Tuple[str, int]:
     """
@@ -107,8 +124,7 @@ def get_moon_phase(date_str: str) -> Tuple[str, int]:
     phase = str(astro.get("moon_phase", ""))
     illum = int(str(astro.get("moon_illumination", "0")) or 0)
 
-    cache.setdefault("moon_phase", {})[date_str] = (phase, illum)
-    _save_cache(cache)
+    _cache_put("moon_phase", date_str, (phase, illum))
     return phase, illum
 
 def get_tide_events(date_str: str) -> List[str]:
@@ -141,8 +157,7 @@ def get_tide_events(date_str: str) -> List[str]:
     if not out:
         out = ["No tide data"]
 
-    cache.setdefault("tide_data", {})[date_str] = out
-    _save_cache(cache)
+    _cache_put("tide_data", date_str, out)
     return out
 
 # ==== Core helpers =================================================
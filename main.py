@@ -17,6 +17,7 @@ from core.approval_flow import create_pending_v2 # (unused)
 from core.m5_reporter import m5_report_loop
 # NEW: thuật toán auto vào và tp
 from core.auto_trade_engine import start_auto_loop
+from core.trade_executor import close_all as close_exchange_clients
 
 from telegram.error import BadRequest  # để bắt lỗi parse_mode
 
@@ -27,6 +28,7 @@ M30_SLOT_GRACE_SEC    = int(os.getenv("M30_SLOT_GRACE_SEC", "6"))
 CHECKLIST_ENABLED     = os.getenv("CHECKLIST_ENABLED", "true").lower() in ("1","true","yes","on")
 CHECKLIST_TIDE_ONLY   = os.getenv("CHECKLIST_TIDE_ONLY", "true").lower() in ("1","true","yes","on")
 CHECKLIST_INTERVAL_MIN= int(os.getenv("CHECKLIST_INTERVAL_MIN", "30"))
+USE_UVLOOP            = os.getenv("USE_UVLOOP", "false").lower() in ("1","true","yes","on")
 
 # 🔔 Checklist rút gọn (Markdown)
 SHORT_CHECKLIST = """
@@ -220,6 +222,14 @@ if __name__ == "__main__":
     app = build_app()
     
     register_join_gate(app)     # Phần quản lý group, chanel private kèo
+    # (Tuỳ chọn) uvloop thay event loop mặc định (USE_UVLOOP=1); thiếu gói/Windows → giữ asyncio
+    if USE_UVLOOP:
+        try:
+            import uvloop
+            uvloop.install()
+        except ImportError:
+            print("[WARN] USE_UVLOOP bật nhưng chưa cài uvloop → dùng asyncio mặc định")
+
     # (Tuỳ chọn) tạo event loop mới để hết DeprecationWarning
     import asyncio as _asyncio
     loop = _asyncio.new_event_loop()
@@ -237,12 +247,15 @@ if __name__ == "__main__":
     token       = os.getenv("TELEGRAM_BOT_TOKEN")
     webhook_path= os.getenv("WEBHOOK_PATH", token or "")
 
-    if use_webhook and base_url:
-        base_url = base_url.rstrip("/")
-        full_url = f"{base_url}/{webhook_path.lstrip('/')}"
-        print(f"Running WEBHOOK on 0.0.0.0:{port} → {full_url}")
-        app.run_webhook(listen="0.0.0.0", port=port, url_path=webhook_path, webhook_url=full_url)
-    else:
-        print("Running POLLING mode")
-        app.run_polling()
+    try:
+        if use_webhook and base_url:
+            base_url = base_url.rstrip("/")
+            full_url = f"{base_url}/{webhook_path.lstrip('/')}"
+            print(f"Running WEBHOOK on 0.0.0.0:{port} → {full_url}")
+            app.run_webhook(listen="0.0.0.0", port=port, url_path=webhook_path, webhook_url=full_url)
+        else:
+            print("Running POLLING mode")
+            app.run_polling()
+    finally:
+        close_exchange_clients()  # đóng pool ExchangeClient
 # ----------------------- /main.py -----------------------
@@ -0,0 +1,48 @@
+import pytest
+
+from core.approval_flow import Status, create_pending_v2, get_pending_raw, mark_done
+from utils.storage import Storage
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("PENDING", Status.PENDING),
+    ("APPROVED", Status.APPROVED),
+    (" rejected ", Status.REJECTED),      # record cũ lưu chuỗi, có thể lệch hoa/thường
+    ("EXPIRED_TIDE", Status.EXPIRED_TIDE),
+    (0, Status.PENDING),
+    (1, Status.APPROVED),
+    (Status.REJECTED, Status.REJECTED),
+])
+def test_status_parse_reads_legacy_strings_and_ints(raw, expected):
+    assert Status.parse(raw) is expected
+
+
+@pytest.mark.parametrize("raw", ["DONE", "", 9, -1, None, 1.5])
+def test_status_parse_rejects_invalid_values(raw):
+    assert Status.parse(raw) is None
+
+
+def test_pending_round_trip_through_storage_patch(tmp_path):
+    storage = Storage(str(tmp_path / "state.json"))
+    rec = create_pending_v2(storage, {"symbol": "BTCUSDT", "suggested_side": "long", "pid": "ea8860"})
+    assert rec["status"] == Status.PENDING.value and rec["suggested_side"] == "LONG"
+    assert get_pending_raw(storage, "ea8860")["status"] == Status.PENDING
+
+    assert mark_done(storage, "ea8860", "APPROVED") is True   # chuỗi cũ vẫn nhận
+    assert get_pending_raw(storage, "ea8860")["status"] == Status.APPROVED.value
+
+    # ghi xuống đĩa dạng int; đọc lại từ file vẫn ra đúng trạng thái
+    reloaded = Storage(str(tmp_path / "state.json"))
+    assert Status.parse(get_pending_raw(reloaded, "ea8860")["status"]) is Status.APPROVED
+
+    assert mark_done(reloaded, "ea8860", "BOGUS") is False
+    assert mark_done(reloaded, "missing", Status.REJECTED) is False
+    assert get_pending_raw(reloaded, "missing") is None
+
+
+def test_legacy_string_record_is_readable_and_patchable(tmp_path):
+    storage = Storage(str(tmp_path / "state.json"))
+    storage.set("pending:abc123", {"pid": "abc123", "status": "PENDING", "symbol": "BTCUSDT"})
+    assert Status.parse(get_pending_raw(storage, "abc123")["status"]) is Status.PENDING
+    assert mark_done(storage, "abc123", Status.REJECTED) is True
+    assert get_pending_raw(storage, "abc123")["status"] == Status.REJECTED.value
@@ -0,0 +1,79 @@
+import asyncio
+import dataclasses
+import time as _time
+from datetime import datetime, timedelta
+
+import pytest
+
+from core import auto_trade_engine as ae
+from utils.storage import Storage
+
+
+class _Clock:
+    """time module thay thế: time() trả giờ giả, các hàm khác giữ nguyên."""
+    def __init__(self, t: float):
+        self.t = t
+
+    def time(self) -> float:
+        return self.t
+
+    def __getattr__(self, name):
+        return getattr(_time, name)
+
+
+class _TGR:
+    def __init__(self, ok: bool, reason: str):
+        self.ok, self.reason, self.counters = ok, reason, {}
+
+
+def _signal(*_a, **_kw):
+    return {"ok": True, "skip": False, "signal": "LONG", "confidence": 3, "text": "blk",
+            "frames": {"H4": {"side": "LONG", "score": 2}, "M30": {"side": "LONG", "score": 2}, "M5": {}}}
+
+
+@pytest.fixture
+def gate_env(tmp_path, monkeypatch):
+    center = datetime(2026, 1, 5, 10, 0, tzinfo=ae.VN_TZ)
+    clock = _Clock(center.timestamp())
+
+    async def late_only_gate(*, now, storage, cfg, scope_uid=None):
+        tau = (now - center).total_seconds() / 3600.0
+        if not (0.5 <= tau <= 2.5):
+            return _TGR(False, "OUT_OF_LATE_BAND")
+        return _TGR(True, "OK")
+
+    monkeypatch.setattr(ae, "time", clock)
+    monkeypatch.setattr(ae, "tide_gate_check", late_only_gate)
+    monkeypatch.setattr(ae, "get_tide_events", lambda d: ["High 10:00 x"])
+    monkeypatch.setattr(ae, "evaluate_signal", _signal)
+    monkeypatch.setattr(ae, "m5_entry_check", None)
+    monkeypatch.setattr(ae, "AUTO_DEBUG", False)
+    monkeypatch.setattr(ae, "_CFG", dataclasses.replace(ae._CFG, m30_stable_min_sec=1800, m30_need_consec_n=1))
+    ae._tide_cache.clear()
+    ae._eval_cache.clear()
+
+    storage = Storage(str(tmp_path / "state.json"))
+    st = storage.get_user(7)
+    st.settings.mode = "auto"
+    storage.put_user(7, st)
+    return center, clock, storage
+
+
+def test_late_band_block_keeps_m30_stability_clock_anchored_at_center(gate_env):
+    center, clock, storage = gate_env
+
+    async def first_pass_tau():
+        t = center - timedelta(hours=1)
+        while t < center + timedelta(hours=2):
+            clock.t = t.timestamp() + 10  # 10s sau khi đóng nến M5
+            g = await ae._auto_gate_decision(7, None, storage)
+            if g and g.get("ok"):
+                return (t - center).total_seconds() / 3600.0, g
+            t += timedelta(minutes=5)
+        return None, None
+
+    tau, gate = asyncio.run(first_pass_tau())
+    # đồng hồ ổn định chạy từ tick đầu tiên sau tâm, không phải từ lúc late-band mở
+    assert tau == pytest.approx(0.5)
+    # kết quả TideGate được chuyển sang decide_once_for_uid để dùng lại
+    assert gate["tgr"] is not None and gate["tgr"].ok
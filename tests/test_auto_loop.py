@@ -0,0 +1,43 @@
+import asyncio
+
+from core import auto_trade_engine as ae
+
+
+class _Storage:
+    data = {"1": {}}
+
+    def auto_enabled_uids(self):
+        return {1}
+
+    def get_users_bulk(self, uids):
+        return {}
+
+
+def test_backoff_uses_the_result_of_the_same_tick(monkeypatch):
+    stamps = []
+
+    async def decide(uid, app, storage, prefetched=None):
+        stamps.append(asyncio.get_running_loop().time())
+        await asyncio.sleep(0.01)  # quyết định vẫn đang chạy ngay sau khi dispatch
+        return "EXECUTED" if len(stamps) == 1 else "not_m5_close"
+
+    async def tp(uid, app, storage):
+        return None
+
+    async def no_prefetch():
+        return None
+
+    monkeypatch.setattr(ae, "decide_once_for_uid", decide)
+    monkeypatch.setattr(ae, "maybe_tp_by_time", tp)
+    monkeypatch.setattr(ae, "_tide_prefetch_loop", no_prefetch)
+    monkeypatch.setattr(ae, "SCHEDULER_TICK_SEC", 0.05)
+    monkeypatch.setattr(ae, "_tick_activity", False)
+
+    async def run():
+        t = asyncio.create_task(ae.start_auto_loop(None, _Storage()))
+        await asyncio.sleep(0.3)
+        t.cancel()
+
+    asyncio.run(run())
+    # tick 1 có việc thật → tick 2 giữ nhịp gốc (0.05s), không bị giãn x2 (0.1s) vì đọc cờ quá sớm
+    assert stamps[1] - stamps[0] < 0.08
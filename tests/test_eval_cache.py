@@ -0,0 +1,35 @@
+import asyncio
+import threading
+import time
+
+from core import auto_trade_engine as ae
+
+
+def test_single_flight_per_slot_and_no_stale_overwrite(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def slow_eval(pair, tide_window_hours=None, balance_usdt=None):
+        with lock:
+            calls.append(pair)
+            n = len(calls)
+        time.sleep(0.3 if n == 1 else 0.05)  # lượt slot cũ về muộn hơn lượt slot mới
+        return {"call": n}
+
+    monkeypatch.setattr(ae, "evaluate_signal", slow_eval)
+    ae._eval_cache.clear()
+    ae._eval_futures.clear()
+
+    async def run():
+        old = asyncio.create_task(ae._evaluate_signal_cached("BTC/USDT", "BTCUSDT", 2.5, 100.0, 1))
+        await asyncio.sleep(0.05)
+        new = [asyncio.create_task(ae._evaluate_signal_cached("BTC/USDT", "BTCUSDT", 2.5, 100.0, 2))
+               for _ in range(5)]
+        return await old, await asyncio.gather(*new)
+
+    r_old, r_new = asyncio.run(run())
+    assert len(calls) == 2                      # 1 lần / slot, dù 5 user cùng slot 2
+    assert r_old == {"call": 1}
+    assert all(r is r_new[0] for r in r_new) and r_new[0] == {"call": 2}
+    assert ae._eval_cache[("BTC/USDT", 2.5, 100.0)] == (2, {"call": 2})
+    assert not ae._eval_futures
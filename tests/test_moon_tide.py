@@ -0,0 +1,37 @@
+import json
+import threading
+
+from data import moon_tide as mt
+
+
+def test_cache_put_is_atomic_and_keeps_other_entries(tmp_path, monkeypatch):
+    path = tmp_path / "tide_moon_cache.json"
+    monkeypatch.setattr(mt, "CACHE_FILE", str(path))
+    mt._cache_put("moon_phase", "2026-01-05", ("Full Moon", 99))
+
+    seen_empty = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            if not mt._load_cache():
+                seen_empty.append(True)
+
+    def writer(i):
+        mt._cache_put("tide_data", f"2026-01-{i:02d}", [f"High 0{i % 10}:00"])
+
+    r = threading.Thread(target=reader)
+    r.start()
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(1, 29)]
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    stop.set()
+    r.join()
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert not seen_empty
+    assert len(data["tide_data"]) == 28
+    assert data["moon_phase"]["2026-01-05"] == ["Full Moon", 99]
+    assert not (tmp_path / "tide_moon_cache.json.tmp").exists()
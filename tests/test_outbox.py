@@ -0,0 +1,48 @@
+import asyncio
+
+from telegram.error import RetryAfter
+
+from core import auto_trade_engine as ae
+
+
+class _Bot:
+    def __init__(self, throttled):
+        self.throttled = throttled
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kw):
+        if self.throttled:
+            raise RetryAfter(0)
+        self.sent.append((chat_id, text))
+
+
+class _App:
+    def __init__(self, throttled=False):
+        self.bot = _Bot(throttled)
+
+
+def _flush(app, chat_id, text):
+    async def main():
+        q = asyncio.Queue()
+        q.put_nowait(((app, chat_id, ()), text))
+        task = asyncio.create_task(ae._outbox_loop(q))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(main())
+
+
+def test_outbox_drop_is_counted_when_retry_is_throttled(monkeypatch):
+    monkeypatch.setattr(ae, "_OUTBOX_FLUSH_SEC", 0.0)
+    before = ae.get_error_stats().get("tg_outbox_drop", 0)
+    _flush(_App(throttled=True), 1, "x")
+    assert ae.get_error_stats().get("tg_outbox_drop", 0) == before + 1
+
+
+def test_outbox_sends_without_drop(monkeypatch):
+    monkeypatch.setattr(ae, "_OUTBOX_FLUSH_SEC", 0.0)
+    before = ae.get_error_stats().get("tg_outbox_drop", 0)
+    app = _App()
+    _flush(app, 1, "x")
+    assert app.bot.sent == [(1, "x")]
+    assert ae.get_error_stats().get("tg_outbox_drop", 0) == before
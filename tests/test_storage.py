@@ -0,0 +1,12 @@
+from utils.storage import Storage
+
+
+def test_auto_enabled_uids_accepts_int_and_str_keys(tmp_path):
+    st = Storage(str(tmp_path / "state.json"))
+    st.data.update({
+        123: {"settings": {"mode": "auto"}},
+        "456": {"settings": {"mode": "manual", "auto_trade_enabled": True}},
+        "789": {"settings": {"mode": "manual"}},
+        "auto_lock_2025-09-24": True,
+    })
+    assert st.auto_enabled_uids() == {123, 456}
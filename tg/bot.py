@@ -22,7 +22,7 @@ from strategy.m5_strategy import m5_snapshot, m5_entry_check
 from core.trade_executor import ExchangeClient, calc_qty, auto_sl_by_leverage
 from core.trade_executor import close_position_on_all, close_position_on_account # ==== /close (đa tài khoản: Binance/BingX/...) ====
 from tg.formatter import format_signal_report, format_daily_moon_tide_report
-from core.approval_flow import mark_done, get_pending
+from core.approval_flow import mark_done, get_pending_raw, Status
 from core.trade_executor import retime_tp_by_time_for_open_positions
 
 # Vòng nền
@@ -66,8 +66,11 @@ def _beautify_report(s: str) -> str:
          .replace("wick<=50%", "wick ≤ 50%")
     return s
 # === Telegram helper: split long HTML safely (<4096 chars) ===
-def _esc(s: str) -> str:
-    return html.escape(s or "", quote=False)
+# [MOD] 1 lượt str.translate (giống html.escape quote=False); nhận cả None/số → dùng chung cho broadcast
+_HTML_TRANS = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+def _esc(s: object) -> str:
+    return ("" if s is None else str(s)).translate(_HTML_TRANS)
 TELEGRAM_HTML_LIMIT = 4096
 _SAFE_BUDGET = 3500  # chừa biên cho thẻ HTML & escape
 
@@ -156,11 +159,6 @@ def _fmt_exec_broadcast(
     - Các field risk/lev/qty/entry_spot có thể None -> sẽ tự ẩn.
     - entry_ids & tp_time là tùy chọn (nếu có sẽ in thêm).
     """
-    import html as _html
-    def _esc(x):
-        try: return _html.escape("" if x is None else str(x), quote=False)
-        except: return str(x)
-
     lines: list[str] = []
     lines.append(f"🚀 <b>EXECUTED</b> | <b>{_esc(pair)}</b> <b>{_esc(str(side).upper())}</b>")
     lines.append(f"• Mode: {mode_label}")
@@ -500,6 +498,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/m5report start|stop — auto M5 snapshot mỗi 5 phút\n"
         "/daily — báo cáo Moon & Tide trong ngày\n"
         "/autolog — log AUTO (tick M5 gần nhất)\n"
+        "/autostats — đếm lỗi nền của AUTO engine\n"
         "/preset &lt;name&gt;|auto — preset theo Moon Phase (P1–P4)\n"
         "/setenv KEY VALUE — chỉnh ENV runtime\n"
         "/setenv_status — xem cấu hình ENV/runtime\n\n"
@@ -909,8 +908,9 @@ def _tp_eta_text(uid: int) -> Optional[str]:
     except Exception:
         return None
 
-    pos = ae._open_pos.get(uid)
-    if not isinstance(pos, dict):
+    ctx = ae._CTX.get(uid)
+    pos = ctx.open_pos if ctx is not None else None
+    if pos is None:
         return None
 
     try:
@@ -919,7 +919,7 @@ def _tp_eta_text(uid: int) -> Optional[str]:
         tp_hours = 4.5
 
     now = now_vn()
-    base = pos.get("tide_center") or pos.get("entry_time") or now
+    base = pos.tide_center or pos.entry_time or now
     try:
         if base.tzinfo is None:
             base = base.replace(tzinfo=now.tzinfo)
@@ -930,7 +930,7 @@ def _tp_eta_text(uid: int) -> Optional[str]:
     remain = deadline - now
     rem_sec = int(remain.total_seconds())
 
-    base_tag = "tide_center" if pos.get("tide_center") else "entry_time"
+    base_tag = "tide_center" if pos.tide_center else "entry_time"
     if rem_sec <= 0:
         return f"TP-by-time (live): {deadline.strftime('%Y-%m-%d %H:%M:%S')} — ⏰ đã quá hạn (base={base_tag}, H={tp_hours:g})"
 
@@ -1277,6 +1277,21 @@ async def m5report_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⏸ ĐÃ TẮT M5 report.")
         return
 
+# ================== /autostats ==================
+async def autostats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        from core import auto_trade_engine as ae
+    except Exception as e:
+        await update.message.reply_text(f"Không import được auto_trade_engine: {e}")
+        return
+
+    stats = ae.get_error_stats()
+    if not stats:
+        await update.message.reply_text("AUTO engine: chưa ghi nhận lỗi nền nào.")
+        return
+    lines = [f"• {k}: {v}" for k, v in sorted(stats.items(), key=lambda kv: -kv[1])]
+    await update.message.reply_text("AUTO engine — lỗi nền theo site:\n" + "\n".join(lines))
+
 # ================== /autolog ==================
 async def autolog_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = _uid(update)
@@ -1296,17 +1311,9 @@ async def autolog_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if not txt:
         try:
-            last_map = getattr(ae, "_last_decision_text", None)
-            if isinstance(last_map, dict):
-                txt = last_map.get(uid)
-        except Exception:
-            txt = None
-
-    if not txt:
-        try:
-            slot_map = getattr(ae, "_last_m5_slot_sent", None)
-            if isinstance(slot_map, dict) and uid in slot_map:
-                txt = f"Tick gần nhất (M5 slot) = {slot_map[uid]} (engine chưa lưu full text cho tick này)."
+            ctx = getattr(ae, "_CTX", {}).get(uid)
+            if ctx is not None and ctx.last_slot >= 0:
+                txt = f"Tick gần nhất (M5 slot) = {ctx.last_slot} (engine chưa lưu full text cho tick này)."
         except Exception:
             txt = None
 
@@ -1329,7 +1336,7 @@ async def approve_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     pid = args[1].strip()
 
     # Lấy pending record
-    p = get_pending(storage_obj, pid)
+    p = get_pending_raw(storage_obj, pid)
     if not p:
         await update.message.reply_text("⚠️ ID không hợp lệ hoặc đã xử lý.")
         return
@@ -1343,7 +1350,7 @@ async def approve_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Tuổi pending
     try:
-        created_utc = datetime.fromisoformat(p.created_at)
+        created_utc = datetime.fromisoformat(p["created_at"])
         if created_utc.tzinfo is None:
             created_utc = created_utc.replace(tzinfo=timezone.utc)
     except Exception:
@@ -1353,7 +1360,7 @@ async def approve_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     age_min = (now_utc - created_utc).total_seconds() / 60.0
 
     if age_min > max_min:
-        mark_done(storage_obj, pid, "REJECTED")
+        mark_done(storage_obj, pid, Status.REJECTED)
         await update.message.reply_text(
             f"⏱ Pending {pid} đã quá hạn (> {max_min} phút). Đã tự động từ chối."
         )
@@ -1371,7 +1378,7 @@ async def approve_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"⚠️ TideGate chặn: {tgr.reason} {tgr.counters}\nGiữ PENDING để duyệt lại trong khung.")
         return
 
-    ok = mark_done(storage_obj, pid, "APPROVED")
+    ok = mark_done(storage_obj, pid, Status.APPROVED)
     await update.message.reply_text("✅ ĐÃ APPROVE. Engine sẽ thực thi (và vẫn re-check TideGate trước khi vào lệnh)."
                                     if ok else "⚠️ ID không hợp lệ hoặc đã xử lý.")
 
@@ -1382,7 +1389,7 @@ async def reject_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Cách dùng: /reject <PENDING_ID>")
         return
     pid = args[1].strip()
-    ok = mark_done(storage_obj, pid, "REJECTED")
+    ok = mark_done(storage_obj, pid, Status.REJECTED)
     await update.message.reply_text("❌ ĐÃ REJECT." if ok else "⚠️ ID không hợp lệ hoặc đã xử lý.")
 
 # ==== /close (đa tài khoản: Binance/BingX/...) ====
@@ -1532,7 +1539,18 @@ def build_app():
 
         asyncio.get_event_loop().create_task(_spawn_after_start())
 
-    app = ApplicationBuilder().token(token).job_queue(None).post_init(_post_init).build()
+    async def _post_shutdown(app: Application):
+        # đóng client HTTP broadcast của auto engine
+        try:
+            from core.auto_trade_engine import close_broadcast_client
+            await close_broadcast_client()
+        except Exception:
+            pass
+
+    app = (
+        ApplicationBuilder().token(token).job_queue(None)
+        .post_init(_post_init).post_shutdown(_post_shutdown).build()
+    )
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_cmd))
@@ -1551,6 +1569,7 @@ def build_app():
     app.add_handler(CommandHandler("close", close_cmd))
     app.add_handler(CommandHandler("daily", daily_cmd))
     app.add_handler(CommandHandler("autolog", autolog_cmd))
+    app.add_handler(CommandHandler("autostats", autostats_cmd))
     app.add_handler(CommandHandler("aboutme", aboutme_command))
     app.add_handler(CommandHandler("journal", journal_command))
     app.add_handler(CommandHandler("recovery_checklist", recovery_command))
@@ -1602,8 +1621,8 @@ async def _apply_auto_preset_now(app=None, silent: bool = True):
     if (not silent) and app:
         try:
             # Ưu tiên AUTO_DEBUG_CHAT_ID nếu là số; fallback dùng TELEGRAM_BROADCAST_CHAT_ID
-            raw = os.getenv("AUTO_DEBUG_CHAT_ID", "")
-            if raw.isdigit():
+            raw = os.getenv("AUTO_DEBUG_CHAT_ID", "").strip()
+            if raw.lstrip("-").isdigit():   # nhận cả id nhóm âm (-100...)
                 chat_id = int(raw)
             else:
                 chat_id = int(TELEGRAM_BROADCAST_CHAT_ID) if str(TELEGRAM_BROADCAST_CHAT_ID).lstrip("-").isdigit() else None
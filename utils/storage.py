@@ -6,11 +6,18 @@ from datetime import datetime
 import pytz
 from config.settings import TIDE_WINDOW_HOURS  # thêm dòng này
 
+# [ADD] orjson (nhanh hơn ~5x) nếu có; fallback stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
 VN_TZ = pytz.timezone("Asia/Ho_Chi_Minh")
 
 STATE_FILE = "bot_state.json"
 
-@dataclass
+# [MOD] slots=True: instance nhỏ hơn, truy cập field nhanh hơn (không __dict__); state còn bị sửa tại chỗ nên không frozen
+@dataclass(slots=True)
 class UserSettings:
     pair: str = "BTC/USDT"
     risk_percent: float = 20.0
@@ -22,12 +29,12 @@ class UserSettings:
     # NEW: bật/tắt report M5 theo lệnh Telegram
     m5_report_enabled: bool = False
 
-@dataclass
+@dataclass(slots=True)
 class UserDay:
     date_str: str
     count: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class PendingSignal:
     id: str
     symbol: str
@@ -38,7 +45,7 @@ class PendingSignal:
     tp: Optional[float] = None
     created_at: str = ""
 
-@dataclass
+@dataclass(slots=True)
 class UserState:
     settings: UserSettings
     today: UserDay
@@ -60,13 +67,19 @@ class Storage:
     def __init__(self, path: str = STATE_FILE):
         self.path = path
         self.data: Dict[str, Any] = {}
+        self._auto_uids: Optional[set] = None
         self._load()
 
     def _load(self):
+        self._auto_uids = None
         if os.path.exists(self.path):
             try:
-                with open(self.path, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
+                if orjson:
+                    with open(self.path, 'rb') as f:
+                        self.data = orjson.loads(f.read())
+                else:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self.data = json.load(f)
             except Exception:
                 self.data = {}
         else:
@@ -74,8 +87,13 @@ class Storage:
 
     def save(self):
         tmp = self.path + ".tmp"
-        with open(tmp, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        if orjson:
+            # OPT_NON_STR_KEYS: giữ hành vi json.dump với key int (vd tide_window_trades)
+            with open(tmp, 'wb') as f:
+                f.write(orjson.dumps(self.data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        else:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
         os.replace(tmp, self.path)
 
     # Backward-compat: một số code gọi storage.persist()
@@ -112,6 +130,18 @@ class Storage:
     def get_value(self, key: str, default: Any = None) -> Any:
         return self.get(key, default)
 
+    def patch(self, key: str, **fields: Any) -> bool:
+        """
+        Cập nhật một phần record dict top-level (read-modify-write 1 lượt, 1 lần save).
+        Trả về False nếu key không tồn tại / không phải dict.
+        """
+        rec = self.data.get(key)
+        if not isinstance(rec, dict):
+            return False
+        rec.update(fields)
+        self.save()
+        return True
+
     def delete(self, key: str) -> None:
         """
         Xoá một key top-level nếu tồn tại.
@@ -121,7 +151,46 @@ class Storage:
             self.save()
 
     # ===================== USER NAMESPACE API =====================
+    def auto_enabled_uids(self) -> set:
+        """
+        Tập uid đang bật auto (mode=auto hoặc auto_trade_enabled), cache tới khi put_user/_load.
+        Scheduler chỉ tick các uid này (+ uid còn vị thế mở) thay vì toàn bộ user.
+        """
+        if self._auto_uids is None:
+            out = set()
+            for k, u in self.data.items():
+                # key có thể là int (orjson OPT_NON_STR_KEYS / code gán trực tiếp) hoặc chuỗi số
+                if not (isinstance(k, int) or (isinstance(k, str) and k.isdigit())) or not isinstance(u, dict):
+                    continue
+                s = u.get("settings") or {}
+                if str(s.get("mode", "manual")).lower() == "auto" or s.get("auto_trade_enabled"):
+                    out.add(int(k))
+            self._auto_uids = out
+        return self._auto_uids
+
     def get_user(self, uid: int) -> UserState:
+        state, dirty = self._get_user(uid)
+        if dirty:
+            self.save()
+        return state
+
+    def get_users_bulk(self, uids) -> Dict[int, UserState]:
+        """
+        Đọc nhiều user 1 lượt cho 1 tick scheduler.
+        User mới / qua ngày cần reset → gom lại, chỉ save() 1 lần.
+        """
+        out: Dict[int, UserState] = {}
+        dirty = False
+        for uid in uids:
+            out[uid], d = self._get_user(uid)
+            dirty = dirty or d
+        if dirty:
+            self.save()
+        return out
+
+    def _get_user(self, uid: int):
+        """Trả (UserState, dirty) — dirty=True nếu self.data vừa bị sửa, caller tự save()."""
+        dirty = False
         key = str(uid)
         if key not in self.data:
             self.data[key] = asdict(UserState(
@@ -131,19 +200,19 @@ class Storage:
                 pending=None,
                 history=[]
             ))
-            self.save()
+            dirty = True
 
         u = self.data[key]
         # reset counter if date changed
         if u["today"]["date_str"] != self._today_str():
             u["today"] = asdict(UserDay(date_str=self._today_str(), count=0))
             u["tide_window_trades"] = {}
-            self.save()
+            dirty = True
 
         # Bảo toàn backward-compat: nếu bản cũ chưa có khóa m5_report_enabled
         if "m5_report_enabled" not in u["settings"]:
             u["settings"]["m5_report_enabled"] = False
-            self.save()
+            dirty = True
 
         settings = UserSettings(**u["settings"])
         today = UserDay(**u["today"])
@@ -158,8 +227,9 @@ class Storage:
             tide_window_trades=tide_window_trades,
             pending=pending,
             history=history
-        )
+        ), dirty
 
     def put_user(self, uid: int, state: UserState):
         self.data[str(uid)] = asdict(state)
+        self._auto_uids = None
         self.save()